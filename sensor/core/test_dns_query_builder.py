@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""Minimal self-test for the DNS query packet builder."""
+
+import os
+import struct
+import sys
+
+sys.path.append(os.path.dirname(__file__))
+
+from uxi_core_exporter import _build_dns_query
+
+
+def run() -> None:
+    """Run basic packet builder checks."""
+    packet = _build_dns_query("example.com", 0x1234)
+
+    txid, flags, qdcount, ancount, nscount, arcount = struct.unpack(
+        ">HHHHHH", packet[:12]
+    )
+    assert txid == 0x1234
+    assert flags == 0x0100  # standard query, recursion desired
+    assert (qdcount, ancount, nscount, arcount) == (1, 0, 0, 0)
+
+    qname = b"\x07example\x03com\x00"
+    assert packet[12 : 12 + len(qname)] == qname
+    # QTYPE=A, QCLASS=IN
+    assert packet[12 + len(qname) :] == struct.pack(">HH", 1, 1)
+
+    # A trailing dot is stripped, not encoded as an empty label.
+    assert _build_dns_query("example.com.", 0x1234) == packet
+
+    # The reply matcher keys on the echoed transaction id.
+    reply = struct.pack(">HHHHHH", 0x1234, 0x8180, 1, 1, 0, 0) + qname
+    assert struct.unpack(">H", reply[:2])[0] == txid
+
+    # An oversized label cannot be length-prefixed; the probe falls back
+    # to dig by catching this ValueError.
+    try:
+        _build_dns_query("x" * 300 + ".com", 0x1234)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("oversized label should raise ValueError")
+
+
+if __name__ == "__main__":
+    run()
+    print("dns query builder ok")
@@ -4,15 +4,23 @@
 from __future__ import annotations
 
 import argparse
+import atexit
+import copy
 import csv
+import errno
+import functools
 import hashlib
 import json
 import logging
 import math
 import os
+import queue
 import re
+import select
 import socket
+import struct
 import subprocess
+import threading
 import time
 import urllib.parse
 import urllib.request
@@ -24,6 +32,11 @@ from typing import Any, Dict, List, Optional, Tuple
 import yaml
 from prometheus_client import Counter, Gauge, start_http_server
 
+try:
+    import orjson  # Optional: faster JSON for state files (falls back to stdlib json)
+except ImportError:  # pragma: no cover - depends on deployment
+    orjson = None
+
 from triage import collect_triage
 
 
@@ -68,6 +81,7 @@ ARUBA_RAW_COLUMNS = [
     "upload_speed",
     "service_uid",
 ]
+_COL_INDEX = {col: i for i, col in enumerate(ARUBA_RAW_COLUMNS)}
 TEST_ALIASES = {
     "ping": "icmp",
     "icmp_ping": "icmp",
@@ -317,9 +331,27 @@ UXI_INCIDENT_RESOLVED_EVENT_DURATION_MS = Gauge(
     "Incident resolved event duration in ms",
     ["sensor", "network", "type", "start_ts", "end_ts"],
 )
+UXI_WRITER_QUEUE_DROPPED_TOTAL = Counter(
+    "uxi_writer_queue_dropped_total",
+    "Disk writes shed because the writer queue was full",
+    ["sensor"],
+)
+
+
+# Directories already created via _ensure_dir; avoids a makedirs syscall
+# on every state/JSONL/CSV write.
+_ENSURED_DIRS: set[str] = set()
+
+
+def _ensure_dir(path: str) -> None:
+    """Create the parent directory of a file path once per process."""
+    directory = os.path.dirname(path)
+    if directory and directory not in _ENSURED_DIRS:
+        os.makedirs(directory, exist_ok=True)
+        _ENSURED_DIRS.add(directory)
 
 
-@dataclass
+@dataclass(slots=True)
 class CommandResult:
     """Result of a command execution."""
 
@@ -330,7 +362,7 @@ class CommandResult:
     timed_out: bool
 
 
-@dataclass
+@dataclass(slots=True)
 class StepResult:
     """Result of a test step."""
 
@@ -353,7 +385,7 @@ class StepResult:
         return data
 
 
-@dataclass
+@dataclass(slots=True)
 class NetworkConfig:
     """Network configuration entry."""
 
@@ -480,6 +512,38 @@ def _normalize_label(value: Optional[str], default: str = "unknown") -> str:
     return value if value else default
 
 
+# Short-lived cache for per-interface lookups that shell out to nmcli or
+# read sysfs. The same values are requested several times per cycle; the
+# TTL keeps them fresh across DHCP renewals, and a lease release/request
+# invalidates the interface explicitly.
+_IFACE_CACHE_TTL_S = 5.0
+_iface_cache: Dict[Tuple[str, str], Tuple[float, Any]] = {}
+
+
+def _iface_ttl_cache(func: Any) -> Any:
+    """Cache a single-iface-argument helper for a few seconds."""
+
+    @functools.wraps(func)
+    def wrapper(iface: str) -> Any:
+        key = (func.__name__, iface)
+        now = time.monotonic()
+        hit = _iface_cache.get(key)
+        if hit is not None and hit[0] > now:
+            return hit[1]
+        value = func(iface)
+        _iface_cache[key] = (now + _IFACE_CACHE_TTL_S, value)
+        return value
+
+    return wrapper
+
+
+def _invalidate_iface_cache(iface: str) -> None:
+    """Drop cached lookups for an interface (e.g. after a lease change)."""
+    for key in [key for key in _iface_cache if key[1] == iface]:
+        _iface_cache.pop(key, None)
+
+
+@_iface_ttl_cache
 def get_ip_config_label(iface: str) -> str:
     """Get IP configuration mode (DHCP/Static)."""
     lines = get_nmcli_lines(iface, "IPV4.METHOD") or get_nmcli_lines(iface, "IP4.METHOD")
@@ -502,6 +566,7 @@ def get_ip_config_label(iface: str) -> str:
     return method.upper() if method else "Unknown"
 
 
+@_iface_ttl_cache
 def get_dhcp_server(iface: str) -> str:
     """Get DHCP server address from nmcli."""
     lines = get_nmcli_lines(iface, "IP4.DHCP_SERVER")
@@ -516,6 +581,7 @@ def get_dhcp_server(iface: str) -> str:
     return "unknown"
 
 
+@_iface_ttl_cache
 def get_dns_servers(iface: str) -> Tuple[str, str]:
     """Get primary/secondary DNS server addresses."""
     lines = get_nmcli_lines(iface, "IP4.DNS")
@@ -527,6 +593,7 @@ def get_dns_servers(iface: str) -> Tuple[str, str]:
     return primary, secondary
 
 
+@_iface_ttl_cache
 def get_interface_mac(iface: str) -> str:
     """Get interface MAC address."""
     value = _read_text_file(f"/sys/class/net/{iface}/address")
@@ -555,6 +622,7 @@ def release_dhcp_lease(iface: str) -> bool:
     Returns:
         True if release was successful, False otherwise.
     """
+    _invalidate_iface_cache(iface)
     # Try dhclient release first
     res = run_command(["dhclient", "-r", iface], timeout_s=5)
     if res.returncode == 0:
@@ -592,6 +660,7 @@ def request_dhcp_lease(iface: str, timeout_s: int = 60) -> Tuple[StepResult, Opt
         Step result and IP address (if successful).
     """
     start = time.monotonic()
+    _invalidate_iface_cache(iface)
     
     # Try dhclient first (most reliable for fresh DORA)
     res = run_command(["dhclient", "-1", "-v", iface], timeout_s=timeout_s)
@@ -872,6 +941,10 @@ def step_gateway_ping(gateway: str) -> StepResult:
     return StepResult(ok, res.duration_ms, error)
 
 
+# Compiled once: dig prints "Query time: N msec" per query.
+_DIG_QT_RE = re.compile(r"Query time:\s*(\d+)\s*msec")
+
+
 def step_dns_resolve() -> StepResult:
     """Resolve example.com using dig.
 
@@ -879,7 +952,7 @@ def step_dns_resolve() -> StepResult:
         Step result.
     """
     res = run_command(["dig", "+tries=1", "+time=2", "example.com"], 5)
-    match = re.search(r"Query time:\s*(\d+)\s*msec", res.stdout)
+    match = _DIG_QT_RE.search(res.stdout)
     query_time_ms = int(match.group(1)) if match else None
     ok = res.returncode == 0 and query_time_ms is not None
     error = None if ok else "dns_resolve_failed"
@@ -1443,6 +1516,25 @@ def update_wifi_environment_metrics(
 
     now = time.time()
     ttl_seconds = int(config.get("ttl_seconds", 300))
+
+    # Quiet-RF fast path: when the visible AP set matches the previous
+    # call, every gauge below already holds the right value. Refresh at
+    # least once per TTL window so last-seen aging still runs.
+    env_fp = hash(
+        tuple(
+            sorted(
+                (str(ap.get("bssid")), str(ap.get("rssi_dbm")), str(ap.get("channel")))
+                for ap in wifi_env
+            )
+        )
+    )
+    fp_state = env_state.setdefault("env_fp", {})
+    fp_key = (network_name, iface)
+    last_fp, last_fp_time = fp_state.get(fp_key, (None, 0.0))
+    if env_fp == last_fp and now - last_fp_time < ttl_seconds:
+        return
+    fp_state[fp_key] = (env_fp, now)
+
     ap_last_seen: Dict[Tuple[str, ...], float] = env_state.setdefault("ap_last_seen", {})
 
     current_keys: set[Tuple[str, ...]] = set()
@@ -1617,13 +1709,19 @@ def run_service_tests(targets: List[str], allow_ping: bool) -> List[Dict[str, Op
     Returns:
         List of service metric dicts.
     """
-    results: List[Dict[str, Optional[float]]] = []
-    for target in targets:
-        if allow_ping:
-            results.append(run_service_ping(target))
-        else:
-            results.append({"target": target, "rtt_avg_ms": None, "loss_pct": None, "jitter_ms": None})
-    return results
+    if not allow_ping:
+        return [
+            {"target": target, "rtt_avg_ms": None, "loss_pct": None, "jitter_ms": None}
+            for target in targets
+        ]
+    if len(targets) <= 1:
+        return [run_service_ping(target) for target in targets]
+    # Each ping blocks ~10 s on its subprocess; probing targets in
+    # parallel makes this stage cost max() instead of sum() of them.
+    import concurrent.futures
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=min(8, len(targets))) as pool:
+        return list(pool.map(run_service_ping, targets))
 
 
 FASTCOM_DEFAULT_TOKEN = "YXNkZmFzZGxmbnNkYWZoYXNkZmhrYWxm"
@@ -1948,6 +2046,30 @@ def run_throughput_test(
     return download_mbps, upload_mbps, elapsed or None
 
 
+# Captive-portal verdicts rarely flip between intervals; cache the last
+# one briefly so back-to-back cycles skip the curl round trip.
+CAPTIVE_PORTAL_TTL_S = 45.0
+# checked_at seeds at -inf so the first call always probes: monotonic
+# time starts near zero at boot, exactly when this exporter is started.
+_cp_cache: Dict[str, Any] = {"verdict": False, "checked_at": float("-inf")}
+
+
+def detect_captive_portal_cached(ttl_s: float = CAPTIVE_PORTAL_TTL_S) -> bool:
+    """detect_captive_portal with a short TTL cache.
+
+    Args:
+        ttl_s: How long a verdict stays fresh, in seconds.
+
+    Returns:
+        Cached or freshly probed captive portal verdict.
+    """
+    now = time.monotonic()
+    if now - _cp_cache["checked_at"] > ttl_s:
+        _cp_cache["verdict"] = detect_captive_portal()
+        _cp_cache["checked_at"] = now
+    return _cp_cache["verdict"]
+
+
 def detect_captive_portal() -> bool:
     """Detect if behind a captive portal.
 
@@ -2168,9 +2290,7 @@ def _save_location_cache(
     provider: Optional[str] = None,
 ) -> None:
     """Persist location payload to cache."""
-    directory = os.path.dirname(path)
-    if directory:
-        os.makedirs(directory, exist_ok=True)
+    _ensure_dir(path)
     data = {
         "lat": payload.get("lat"),
         "lon": payload.get("lon"),
@@ -2496,6 +2616,42 @@ def _set_gauge_value(gauge: Gauge, labels: Dict[str, str], value: Optional[float
     gauge.labels(**labels).set(float("nan") if value is None else value)
 
 
+# Bound children for the six hot per-service metrics, keyed by label values.
+_SERVICE_CHILD_CACHE: Dict[Tuple[str, str, str, str, str], Tuple[Any, ...]] = {}
+
+
+def _service_children(
+    sensor: str,
+    network: str,
+    target: str,
+    scope: str,
+    name: str,
+) -> Tuple[Any, Any, Any, Any, Any, Any]:
+    """Bind the six per-service metric children once per label set.
+
+    .labels() hashes its kwargs and walks the child dict on every call,
+    and the hot path writes six series per service per cycle. Caching the
+    bound children turns that into one dict lookup plus plain set() calls.
+
+    Returns:
+        (rtt, jitter, loss, up, last_test, scope) gauge children.
+    """
+    key = (sensor, network, target, scope, name)
+    children = _SERVICE_CHILD_CACHE.get(key)
+    if children is None:
+        labels = {"sensor": sensor, "network": network, "target": target, "scope": scope}
+        children = (
+            UXI_SERVICE_RTT_AVG_MS.labels(**labels),
+            UXI_SERVICE_JITTER_MS.labels(**labels),
+            UXI_SERVICE_PACKET_LOSS_PCT.labels(**labels),
+            UXI_SERVICE_UP.labels(name=name, **labels),
+            UXI_SERVICE_LAST_TEST_TIMESTAMP.labels(**labels),
+            UXI_SERVICE_SCOPE.labels(**labels),
+        )
+        _SERVICE_CHILD_CACHE[key] = children
+    return children
+
+
 def _set_singleton_gauge(
     gauge: Gauge,
     label_names: List[str],
@@ -2606,27 +2762,24 @@ def update_metrics(
         else:
             scope = "external"
         
-        labels = {"sensor": sensor_name, "network": network_name, "target": target, "scope": scope}
-        UXI_SERVICE_SCOPE.labels(
-            sensor=sensor_name, network=network_name, target=target, scope=scope
-        ).set(1.0)
-        _set_gauge_value(UXI_SERVICE_RTT_AVG_MS, labels, result.get("rtt_avg_ms"))
-        _set_gauge_value(UXI_SERVICE_PACKET_LOSS_PCT, labels, result.get("loss_pct"))
-        _set_gauge_value(UXI_SERVICE_JITTER_MS, labels, result.get("jitter_ms"))
-        
+        service_name = result.get("name", target)
+        rtt_g, jitter_g, loss_g, up_g, last_g, scope_g = _service_children(
+            sensor_name, network_name, target, scope, service_name
+        )
+        scope_g.set(1.0)
+        rtt = result.get("rtt_avg_ms")
+        rtt_g.set(float("nan") if rtt is None else rtt)
+        jitter = result.get("jitter_ms")
+        jitter_g.set(float("nan") if jitter is None else jitter)
+
         # Service UP status (derived from packet loss)
         loss_pct = result.get("loss_pct")
-        service_name = result.get("name", target)
+        loss_g.set(float("nan") if loss_pct is None else loss_pct)
         if loss_pct is not None:
-            is_up = 1.0 if loss_pct < 100 else 0.0
-            UXI_SERVICE_UP.labels(
-                sensor=sensor_name, network=network_name, target=target, scope=scope, name=service_name
-            ).set(is_up)
-        
+            up_g.set(1.0 if loss_pct < 100 else 0.0)
+
         # Last test timestamp
-        UXI_SERVICE_LAST_TEST_TIMESTAMP.labels(
-            sensor=sensor_name, network=network_name, target=target, scope=scope
-        ).set(time.time())
+        last_g.set(time.time())
 
 
 def collect_network_info(
@@ -2813,8 +2966,13 @@ def _get_services(cfg: Dict[str, Any]) -> Dict[str, List[Dict[str, Any]]]:
     }
 
 
+@functools.lru_cache(maxsize=1024)
 def _extract_host(target: str) -> str:
-    """Extract hostname/IP from a target that may be a URL."""
+    """Extract hostname/IP from a target that may be a URL.
+
+    Cached: the service list is effectively static, so each target is
+    parsed once rather than every cycle.
+    """
     parsed = urllib.parse.urlparse(target)
     if parsed.scheme and parsed.hostname:
         return parsed.hostname
@@ -3006,26 +3164,19 @@ def evaluate_incidents(
             weak_signal = rssi < thresholds.get("rssi_dbm", -75)
 
     # Packet loss, high latency, high jitter from service results
-    max_loss = None
-    max_latency = None
-    max_jitter = None
-    for result in service_results:
-        target = result.get("target")
-        if target == "gateway":
-            continue
-        loss_pct = result.get("loss_pct")
-        rtt_ms = result.get("rtt_avg_ms")
-        jitter_ms = result.get("jitter_ms")
-
-        if loss_pct is not None:
-            if max_loss is None or loss_pct > max_loss:
-                max_loss = loss_pct
-        if rtt_ms is not None:
-            if max_latency is None or rtt_ms > max_latency:
-                max_latency = rtt_ms
-        if jitter_ms is not None:
-            if max_jitter is None or jitter_ms > max_jitter:
-                max_jitter = jitter_ms
+    non_gateway = [r for r in service_results if r.get("target") != "gateway"]
+    max_loss = max(
+        (r["loss_pct"] for r in non_gateway if r.get("loss_pct") is not None),
+        default=None,
+    )
+    max_latency = max(
+        (r["rtt_avg_ms"] for r in non_gateway if r.get("rtt_avg_ms") is not None),
+        default=None,
+    )
+    max_jitter = max(
+        (r["jitter_ms"] for r in non_gateway if r.get("jitter_ms") is not None),
+        default=None,
+    )
 
     packet_loss = bool(
         max_loss is not None and max_loss > thresholds.get("packet_loss_pct", 5)
@@ -3061,20 +3212,49 @@ def _parse_incident_key(key: str) -> Tuple[str, str]:
     return key, ""
 
 
+def _dump_state_bytes(state: Dict[str, Any]) -> bytes:
+    """Serialize a state dict to JSON bytes (orjson when available)."""
+    if orjson is not None:
+        return orjson.dumps(state)
+    return json.dumps(state, ensure_ascii=True).encode("utf-8")
+
+
+def _load_state_bytes(buf: bytes) -> Any:
+    """Parse JSON bytes (orjson when available)."""
+    if orjson is not None:
+        return orjson.loads(buf)
+    return json.loads(buf)
+
+
+# Digest of the last state bytes written per path; lets steady-state
+# cycles (no incident or UID changes) skip rewriting the whole blob.
+_STATE_DIGESTS: Dict[str, bytes] = {}
+
+
+def _write_state_if_changed(path: str, state: Dict[str, Any]) -> None:
+    """Rewrite a JSON state file only when its serialized form changed."""
+    data = _dump_state_bytes(state)
+    digest = hashlib.blake2b(data, digest_size=16).digest()
+    if _STATE_DIGESTS.get(path) == digest:
+        return
+    _ensure_dir(path)
+    with open(path, "wb") as handle:
+        handle.write(data)
+    _STATE_DIGESTS[path] = digest
+
+
 def load_incident_state(path: str) -> Dict[str, Any]:
     """Load incident state from JSON."""
     try:
-        with open(path, "r", encoding="utf-8") as handle:
-            return json.load(handle)
-    except (OSError, json.JSONDecodeError):
+        with open(path, "rb") as handle:
+            return _load_state_bytes(handle.read())
+    except (OSError, ValueError):
         return {"active": {}, "resolved": {}, "counters": {}}
 
 
 def save_incident_state(path: str, state: Dict[str, Any]) -> None:
-    """Persist incident state to JSON."""
-    os.makedirs(os.path.dirname(path), exist_ok=True)
-    with open(path, "w", encoding="utf-8") as handle:
-        json.dump(state, handle, ensure_ascii=True)
+    """Persist incident state to JSON (skipped when unchanged)."""
+    _write_state_if_changed(path, state)
 
 
 def initialize_incident_counters(state: Dict[str, Any]) -> None:
@@ -3082,7 +3262,7 @@ def initialize_incident_counters(state: Dict[str, Any]) -> None:
     counters = state.get("counters") or {}
     for key, per_type in counters.items():
         sensor_name, network_name = _parse_incident_key(key)
-        for inc_type, total in (per_type or {}).items():
+        for inc_type, total in (per_type.items() if per_type else ()):
             try:
                 value = int(total)
             except (TypeError, ValueError):
@@ -3102,6 +3282,8 @@ def update_incident_state(
 ) -> List[Tuple[str, Dict[str, Any]]]:
     """Update incident state and return newly resolved events."""
     now = datetime.now(timezone.utc)
+    now_iso = now.isoformat()
+    now_epoch = now.timestamp()
     key = _incident_key(sensor_name, network_name)
     active_map = state.setdefault("active", {}).setdefault(key, {})
     resolved_map = state.setdefault("resolved", {}).setdefault(key, {})
@@ -3112,18 +3294,26 @@ def update_incident_state(
         is_active = bool(active_flags.get(inc_type))
         if is_active:
             if inc_type not in active_map:
-                active_map[inc_type] = {"start_ts": now.isoformat()}
+                active_map[inc_type] = {
+                    "start_ts": now_iso,
+                    "_start_epoch": now_epoch,
+                }
         else:
             if inc_type in active_map:
-                start_ts = active_map.pop(inc_type).get("start_ts") or now.isoformat()
-                try:
-                    start_dt = datetime.fromisoformat(start_ts)
-                except ValueError:
-                    start_dt = now
-                duration_ms = int((now - start_dt).total_seconds() * 1000)
+                entry = active_map.pop(inc_type)
+                start_ts = entry.get("start_ts") or now_iso
+                # Prefer the cached epoch; fall back to parsing start_ts for
+                # state written by older versions.
+                start_epoch = entry.get("_start_epoch")
+                if start_epoch is None:
+                    try:
+                        start_epoch = datetime.fromisoformat(start_ts).timestamp()
+                    except ValueError:
+                        start_epoch = now_epoch
+                duration_ms = int((now_epoch - float(start_epoch)) * 1000)
                 event = {
                     "start_ts": start_ts,
-                    "end_ts": now.isoformat(),
+                    "end_ts": now_iso,
                     "duration_ms": duration_ms,
                 }
                 events = resolved_map.setdefault(inc_type, [])
@@ -3144,18 +3334,30 @@ def update_incident_metrics(
     metrics_state: Dict[str, Any],
 ) -> None:
     """Update incident metrics from state."""
-    for inc_type in INCIDENT_TYPES:
-        active = 1.0 if active_flags.get(inc_type) else 0.0
-        UXI_INCIDENT_ACTIVE.labels(
-            sensor=sensor_name, network=network_name, type=inc_type
-        ).set(active)
+    active_gauges = metrics_state.setdefault("active_gauges", {})
+    gauges = active_gauges.get((sensor_name, network_name))
+    if gauges is None:
+        # The (sensor, network, type) label set is stable, so bind the child
+        # gauges once and reuse them on every cycle.
+        gauges = tuple(
+            (
+                inc_type,
+                UXI_INCIDENT_ACTIVE.labels(
+                    sensor=sensor_name, network=network_name, type=inc_type
+                ),
+            )
+            for inc_type in INCIDENT_TYPES
+        )
+        active_gauges[(sensor_name, network_name)] = gauges
+    for inc_type, gauge in gauges:
+        gauge.set(1.0 if active_flags.get(inc_type) else 0.0)
 
     key = _incident_key(sensor_name, network_name)
     resolved_map = state.get("resolved", {}).get(key, {})
     current_keys: set[Tuple[str, ...]] = set()
 
     for inc_type, events in resolved_map.items():
-        for event in events or []:
+        for event in (events if events else ()):
             start_ts = str(event.get("start_ts", ""))
             end_ts = str(event.get("end_ts", ""))
             duration = float(event.get("duration_ms", 0.0))
@@ -3181,16 +3383,125 @@ def update_incident_metrics(
     event_keys.update(current_keys)
 
 
+def update_all_metrics(
+    sensor_name: str,
+    network: NetworkConfig,
+    network_info: Dict[str, str],
+    sensor_model: str,
+    sensor_serial: str,
+    location_cfg: Optional[Dict[str, str]],
+    info_state: Dict[str, Dict[Any, Tuple[str, ...]]],
+    steps: Dict[str, StepResult],
+    ip_present: bool,
+    wifi_info: Optional[Dict[str, Any]],
+    service_results: List[Dict[str, Optional[float]]],
+    internal_targets: set[str],
+    external_targets: set[str],
+    wifi_bssid_state: Dict[Any, Tuple[str, ...]],
+    internal_result: Optional[Dict[str, Optional[float]]],
+    external_result: Optional[Dict[str, Optional[float]]],
+    incident_flags: Dict[str, bool],
+    incident_state: Dict[str, Any],
+    incident_metrics_state: Dict[str, Any],
+) -> None:
+    """Run every per-cycle metric updater from a single call site.
+
+    The updaters walk disjoint inputs (step results, service results,
+    incident state), so they stay separate functions; this wrapper keeps
+    the main loop down to one metrics call per cycle.
+    """
+    update_info_metrics(
+        sensor_name=sensor_name,
+        network=network,
+        network_info=network_info,
+        sensor_model=sensor_model,
+        sensor_serial=sensor_serial,
+        location_cfg=location_cfg,
+        info_state=info_state,
+    )
+    update_metrics(
+        sensor_name=sensor_name,
+        network_name=network.name,
+        steps=steps,
+        ip_present=ip_present,
+        wifi_info=wifi_info,
+        service_results=service_results,
+        internal_targets=internal_targets,
+        external_targets=external_targets,
+        wifi_bssid_state=wifi_bssid_state,
+    )
+    update_voip_mos_metrics(
+        sensor_name=sensor_name,
+        network_name=network.name,
+        internal_result=internal_result,
+        external_result=external_result,
+    )
+    update_incident_metrics(
+        sensor_name=sensor_name,
+        network_name=network.name,
+        active_flags=incident_flags,
+        state=incident_state,
+        metrics_state=incident_metrics_state,
+    )
+
+
+def _json_default(value: Any) -> str:
+    """Serialize non-JSON types (datetimes) for the stdlib fallback."""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"not JSON serializable: {type(value)!r}")
+
+
+# Long-lived append handles per JSONL path; re-opening the log for every
+# record cost an open/close syscall pair per interval.
+_JSONL_HANDLES: Dict[str, Any] = {}
+
+
+def _jsonl_handle(path: str) -> Any:
+    """Return a cached append-mode handle for a JSONL path."""
+    handle = _JSONL_HANDLES.get(path)
+    if handle is None or handle.closed:
+        _ensure_dir(path)
+        handle = open(path, "ab")  # pylint: disable=consider-using-with
+        _JSONL_HANDLES[path] = handle
+    return handle
+
+
+def _close_jsonl_handles() -> None:
+    """Close cached JSONL handles on interpreter shutdown."""
+    for handle in _JSONL_HANDLES.values():
+        try:
+            handle.close()
+        except OSError:
+            pass
+    _JSONL_HANDLES.clear()
+
+
+atexit.register(_close_jsonl_handles)
+
+
 def write_jsonl(path: str, record: Dict[str, Any]) -> None:
     """Append a JSONL record to the log file.
 
+    Each record is flushed immediately: at one record per interval, a
+    size-threshold buffer would hold minutes of data hostage to a crash.
+
     Args:
         path: JSONL file path.
         record: Record dictionary.
     """
-    os.makedirs(os.path.dirname(path), exist_ok=True)
-    with open(path, "a", encoding="utf-8") as handle:
-        handle.write(json.dumps(record, ensure_ascii=True) + "\n")
+    if orjson is not None:
+        buf = orjson.dumps(record) + b"\n"
+    else:
+        buf = (
+            json.dumps(
+                record, ensure_ascii=True, separators=(",", ":"), default=_json_default
+            ).encode("ascii")
+            + b"\n"
+        )
+    handle = _jsonl_handle(path)
+    handle.write(buf)
+    handle.flush()
 
 
 def _format_aruba_timestamp(ts: Optional[datetime] = None) -> str:
@@ -3201,27 +3512,32 @@ def _format_aruba_timestamp(ts: Optional[datetime] = None) -> str:
 
 
 def _stable_hex(value: str, length: int = 12) -> str:
-    """Stable short hex digest for IDs."""
-    digest = hashlib.sha1(value.encode("utf-8")).hexdigest()
+    """Stable short hex digest for IDs.
+
+    blake2b sized to the requested length is cheaper than SHA-1, which
+    produced 20 bytes we mostly threw away. Newly generated IDs differ
+    from the old SHA-1 scheme; UIDs already persisted in state files keep
+    their stored value.
+    """
+    digest_size = max(1, (length + 1) // 2)
+    digest = hashlib.blake2b(value.encode("utf-8"), digest_size=digest_size).hexdigest()
     return digest[:length]
 
 
 def load_aruba_state(path: str) -> Dict[str, Any]:
     """Load Aruba export state (sensor_uid/service_uids/network_uids)."""
     try:
-        with open(path, "r", encoding="utf-8") as handle:
-            data = json.load(handle)
+        with open(path, "rb") as handle:
+            data = _load_state_bytes(handle.read())
             if isinstance(data, dict):
                 return data
-    except (OSError, json.JSONDecodeError):
+    except (OSError, ValueError):
         pass
     return {"sensor_uid": "", "services": {}, "networks": {}}
 
 
 def save_aruba_state(path: str, state: Dict[str, Any]) -> None:
-    os.makedirs(os.path.dirname(path), exist_ok=True)
-    with open(path, "w", encoding="utf-8") as handle:
-        json.dump(state, handle, ensure_ascii=True)
+    _write_state_if_changed(path, state)
 
 
 def get_or_create_sensor_uid(state: Dict[str, Any]) -> str:
@@ -3258,19 +3574,30 @@ def get_or_create_service_uid(state: Dict[str, Any], scope: str, name: str, targ
     return uid
 
 
+# CSV paths whose header has been verified this run; skips a stat() per flush.
+_HEADERED_CSVS: set[str] = set()
+
+
 def ensure_aruba_csv_header(path: str) -> None:
     """Create CSV and header if missing."""
-    os.makedirs(os.path.dirname(path), exist_ok=True)
-    if os.path.exists(path) and os.path.getsize(path) > 0:
+    if path in _HEADERED_CSVS:
         return
-    with open(path, "w", encoding="utf-8", newline="") as handle:
-        writer = csv.DictWriter(handle, fieldnames=ARUBA_RAW_COLUMNS)
-        writer.writeheader()
+    _ensure_dir(path)
+    if not (os.path.exists(path) and os.path.getsize(path) > 0):
+        with open(path, "w", encoding="utf-8", newline="") as handle:
+            csv.writer(handle).writerow(ARUBA_RAW_COLUMNS)
+    _HEADERED_CSVS.add(path)
 
 
 def _fmt_float(value: Optional[float], decimals: Optional[int] = None) -> str:
     if value is None:
         return ""
+    # Fast path: plain ints and integral floats cover most row fields and
+    # skip the float()/isfinite/round machinery below.
+    if type(value) is int:
+        return str(value)
+    if type(value) is float and value.is_integer():
+        return str(int(value))
     try:
         val = float(value)
     except (TypeError, ValueError):
@@ -3282,30 +3609,80 @@ def _fmt_float(value: Optional[float], decimals: Optional[int] = None) -> str:
     return f"{val:.7f}".rstrip("0").rstrip(".")
 
 
-def append_aruba_rows(path: str, rows: List[Dict[str, Any]]) -> None:
+def append_aruba_rows(path: str, rows: List[List[str]]) -> None:
     if not rows:
         return
     ensure_aruba_csv_header(path)
     with open(path, "a", encoding="utf-8", newline="") as handle:
-        writer = csv.DictWriter(handle, fieldnames=ARUBA_RAW_COLUMNS)
-        for row in rows:
-            # Fill missing columns with empty string
-            out = {col: "" for col in ARUBA_RAW_COLUMNS}
-            for col, val in (row or {}).items():
-                if col not in out:
-                    continue
-                out[col] = "" if val is None else str(val)
-            writer.writerow(out)
+        csv.writer(handle).writerows(rows)
+
+
+# Cached UDP sockets per resolver; each carries many queries over the
+# exporter lifetime instead of paying socket setup (or a dig subprocess)
+# per probe.
+_DNS_SOCKETS: Dict[str, socket.socket] = {}
+
+
+def _build_dns_query(domain: str, txid: int) -> bytes:
+    """Build a minimal DNS A-record query packet."""
+    header = struct.pack(">HHHHHH", txid, 0x0100, 1, 0, 0, 0)
+    qname = b"".join(
+        bytes([len(label)]) + label.encode("ascii")
+        for label in domain.strip(".").split(".")
+    )
+    # QTYPE=A, QCLASS=IN
+    return header + qname + b"\x00" + struct.pack(">HH", 1, 1)
+
+
+def _udp_dns_query_seconds(domain: str, server: str, timeout_s: float = 2.0) -> Optional[float]:
+    """Time one DNS query against a resolver over a cached UDP socket."""
+    sock = _DNS_SOCKETS.get(server)
+    if sock is None:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.connect((server, 53))
+        _DNS_SOCKETS[server] = sock
+    sock.settimeout(timeout_s)
+    txid = int.from_bytes(os.urandom(2), "big")
+    query = _build_dns_query(domain, txid)
+    start = time.perf_counter()
+    try:
+        sock.send(query)
+        deadline = start + timeout_s
+        while True:
+            data = sock.recv(4096)
+            elapsed = time.perf_counter() - start
+            if len(data) >= 2 and struct.unpack(">H", data[:2])[0] == txid:
+                return elapsed
+            if time.perf_counter() >= deadline:
+                return None
+    except socket.timeout:
+        return None
+    except OSError:
+        # Socket is unusable (e.g., the interface went away); drop it so
+        # the next probe reconnects, and let the caller fall back to dig.
+        _DNS_SOCKETS.pop(server, None)
+        try:
+            sock.close()
+        except OSError:
+            pass
+        raise
 
 
 def _dns_query_time_seconds(domain: str, server: Optional[str] = None) -> Optional[float]:
     """Return DNS query time in seconds for a resolver."""
+    if server:
+        try:
+            return _udp_dns_query_seconds(domain, server)
+        except (OSError, UnicodeError, ValueError):
+            # ValueError: a label over 255 bytes in a configured domain
+            # cannot be length-prefixed; dig accepts the string as-is.
+            pass
     cmd = ["dig", "+tries=1", "+time=2"]
     if server:
         cmd.append(f"@{server}")
     cmd.append(domain)
     res = run_command(cmd, 5)
-    match = re.search(r"Query time:\s*(\d+)\s*msec", res.stdout)
+    match = _DIG_QT_RE.search(res.stdout)
     if res.returncode != 0 or not match:
         return None
     return int(match.group(1)) / 1000.0
@@ -3321,24 +3698,57 @@ def _http_get_elapsed_seconds(url: str) -> Optional[float]:
 def _tcp_connect_stats(host: str, port: int, attempts: int = 10) -> Tuple[Optional[float], Optional[float], Optional[float]]:
     """TCP connect 'ping' style stats.
 
+    All attempts are fired as one non-blocking burst and completed via
+    select(), so wall time is ~1 handshake RTT instead of attempts x RTT.
     Returns (latency_ms_avg, jitter_ms_std, loss_pct).
     """
     durations: List[float] = []
     failures = 0
+    pending: Dict[socket.socket, float] = {}
+    try:
+        addr = socket.getaddrinfo(host, port, socket.AF_INET, socket.SOCK_STREAM)[0][4]
+    except OSError:
+        return None, None, 100.0
     for _ in range(attempts):
-        start = time.monotonic()
         sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.settimeout(2)
+        sock.setblocking(False)
+        start = time.monotonic()
         try:
-            sock.connect((host, port))
+            err = sock.connect_ex(addr)
+        except OSError:
+            failures += 1
+            sock.close()
+            continue
+        if err == 0:
             durations.append((time.monotonic() - start) * 1000.0)
-        except Exception:  # pylint: disable=broad-except
+            sock.close()
+        elif err in (errno.EINPROGRESS, errno.EWOULDBLOCK):
+            pending[sock] = start
+        else:
             failures += 1
-        finally:
-            try:
-                sock.close()
-            except OSError:
-                pass
+            sock.close()
+    deadline = time.monotonic() + 2.0
+    while pending:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        try:
+            _, writable, _ = select.select([], list(pending), [], remaining)
+        except OSError:
+            break
+        if not writable:
+            continue
+        done = time.monotonic()
+        for sock in writable:
+            start = pending.pop(sock)
+            if sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR) == 0:
+                durations.append((done - start) * 1000.0)
+            else:
+                failures += 1
+            sock.close()
+    for sock in pending:
+        failures += 1
+        sock.close()
     total = attempts
     loss_pct = (failures / total * 100.0) if total else None
     if not durations:
@@ -3361,65 +3771,69 @@ def _aruba_row(
     network_alias: str,
     interface_type: str,
     ts: Optional[datetime] = None,
+    ts_str: Optional[str] = None,
     wifi_info: Optional[Dict[str, Any]] = None,
     **kwargs: Any,
-) -> Dict[str, Any]:
+) -> List[str]:
     """Build Aruba CSV row for any test type including wifi_data.
 
     Args:
         test_type_code: Test type (ping, http_get, throughput, voip_mos, wifi_data, etc.)
         sensor_uid, sensor_name, network_uid, network_alias, interface_type: Context fields.
         ts: Timestamp for the row.
+        ts_str: Pre-formatted timestamp; skips formatting ts when given.
         wifi_info: WiFi link info dict (for wifi_data rows).
         **kwargs: Additional fields (target, name, service_uid, latency, etc.)
 
     Returns:
-        Dict with all CSV columns.
+        List of values in ARUBA_RAW_COLUMNS order.
     """
     def fmt(val: Any, decimals: int = 2) -> str:
         return _fmt_float(val, decimals=decimals) if val is not None else ""
 
-    row = {
-        "timestamp": _format_aruba_timestamp(ts),
-        "sensor_uid": sensor_uid,
-        "sensor_name": sensor_name,
-        "network_uid": network_uid,
-        "network_alias": network_alias,
-        "interface_type": interface_type,
-        "test_type_code": test_type_code,
-        "target": kwargs.get("target", ""),
-        "name": kwargs.get("name", ""),
-        "ip_address": kwargs.get("ip_address", ""),
-        "elapsed_time_seconds": fmt(kwargs.get("elapsed_s"), 3),
-        "bssid": "",
-        "channel": "",
-        "channel_utilization": "",
-        "frequency": "",
-        "rssi": "",
-        "latency": fmt(kwargs.get("latency")),
-        "jitter": fmt(kwargs.get("jitter")),
-        "packet_loss": fmt(kwargs.get("packet_loss")),
-        "download_speed": fmt(kwargs.get("download_speed")),
-        "upload_speed": fmt(kwargs.get("upload_speed")),
-        "service_uid": kwargs.get("service_uid", ""),
-    }
+    # Positional row in ARUBA_RAW_COLUMNS order; cheaper than a dict walk
+    # in DictWriter for ~20 columns per row.
+    row = [
+        ts_str if ts_str is not None else _format_aruba_timestamp(ts),
+        sensor_uid,
+        sensor_name,
+        network_uid,
+        network_alias,
+        interface_type,
+        test_type_code,
+        str(kwargs.get("target", "")),
+        str(kwargs.get("name", "")),
+        str(kwargs.get("ip_address", "")),
+        fmt(kwargs.get("elapsed_s"), 3),
+        "",  # bssid
+        "",  # channel
+        "",  # channel_utilization
+        "",  # frequency
+        "",  # rssi
+        fmt(kwargs.get("latency")),
+        fmt(kwargs.get("jitter")),
+        fmt(kwargs.get("packet_loss")),
+        fmt(kwargs.get("download_speed")),
+        fmt(kwargs.get("upload_speed")),
+        str(kwargs.get("service_uid", "")),
+    ]
 
     # Populate wifi fields if wifi_info provided
     if wifi_info:
         if wifi_info.get("bssid"):
-            row["bssid"] = str(wifi_info["bssid"])
+            row[_COL_INDEX["bssid"]] = str(wifi_info["bssid"])
         if wifi_info.get("channel") is not None:
-            row["channel"] = str(int(wifi_info["channel"]))
+            row[_COL_INDEX["channel"]] = str(int(wifi_info["channel"]))
         if wifi_info.get("channel_busy_pct") is not None:
-            row["channel_utilization"] = fmt(float(wifi_info["channel_busy_pct"]) / 100.0)
+            row[_COL_INDEX["channel_utilization"]] = fmt(float(wifi_info["channel_busy_pct"]) / 100.0)
         if wifi_info.get("freq_mhz") is not None:
             try:
-                row["frequency"] = str(int(float(wifi_info["freq_mhz"]) * 1_000_000))
+                row[_COL_INDEX["frequency"]] = str(int(float(wifi_info["freq_mhz"]) * 1_000_000))
             except (TypeError, ValueError):
                 pass
         if wifi_info.get("rssi_dbm") is not None:
             try:
-                row["rssi"] = str(int(wifi_info["rssi_dbm"]))
+                row[_COL_INDEX["rssi"]] = str(int(wifi_info["rssi_dbm"]))
             except (TypeError, ValueError):
                 pass
 
@@ -3563,6 +3977,8 @@ def run_aruba_mode(
     
     Each test creates: test_row + wifi_data_row (same timestamp)
     """
+    import concurrent.futures
+
     aruba_cfg = get_aruba_config(cfg)
     raw_path = str(aruba_cfg["raw_csv_path"])
     dns_domain = str(aruba_cfg["dns_domain"])
@@ -3587,7 +4003,21 @@ def run_aruba_mode(
         for scope in ("internal", "external")
         for entry in services.get(scope, [])
     ]
-    
+
+    # Precompute per-service fields that are identical every cycle: the
+    # normalized name/target, frequency lookup and persisted UID do not
+    # belong in the hot per-cycle loop.
+    for scope, service in all_services:
+        svc_name = str(service.get("name") or "").strip()
+        svc_target = str(service.get("target") or "").strip()
+        service["_name"] = svc_name
+        service["_target"] = svc_target
+        service["_key"] = f"{scope}:{svc_name}:{svc_target}"
+        service["_freq_s"] = get_service_frequency_seconds(service)
+        if svc_name:
+            service["_uid"] = get_or_create_service_uid(state, scope, svc_name, svc_target)
+
+
     # Track last run time per service for frequency control
     # Key format: "{scope}:{name}:{target}"
     last_run_times: Dict[str, float] = {}
@@ -3600,6 +4030,20 @@ def run_aruba_mode(
     # Get inter-test delay (helps match Aruba UXI test frequency)
     inter_test_delay = float(aruba_cfg.get("inter_test_delay_seconds", 5.0))
 
+    # One worker pool for all per-service probe batches; spawning a fresh
+    # executor per service added thread setup/teardown to every batch.
+    probe_pool = concurrent.futures.ThreadPoolExecutor(
+        max_workers=6, thread_name_prefix="probe"
+    )
+
+    # Post-network housekeeping (state saves + lease release) is not needed
+    # for the next network's measurements; it runs on this single worker and
+    # overlaps the inter-network delay.
+    post_pool = concurrent.futures.ThreadPoolExecutor(
+        max_workers=1, thread_name_prefix="post"
+    )
+    post_future: Optional[concurrent.futures.Future] = None
+
     # Helper to build common context dict
     def ctx(network_uid: str, network_alias: str, iface_type: str) -> Dict[str, str]:
         return {
@@ -3642,6 +4086,16 @@ def run_aruba_mode(
                 pass
             current_test_labels = {}
 
+    # Buffer rows and flush in batches so each cycle does O(1) file opens
+    # instead of one open/close pair per test step.
+    pending_rows: List[List[str]] = []
+
+    def flush_pending_rows() -> None:
+        """Write buffered CSV rows to disk."""
+        if pending_rows:
+            append_aruba_rows(raw_path, pending_rows)
+            pending_rows.clear()
+
     # Helper to append test row + wifi_data row (Aruba pattern)
     def append_with_wifi(
         network: "NetworkConfig",
@@ -3653,11 +4107,15 @@ def run_aruba_mode(
         **test_kwargs: Any,
     ) -> None:
         wifi_info = _collect_wifi_info_for_aruba(network)
-        rows = [
-            _aruba_row(test_type, **c, ts=ts, name=svc_name, service_uid=service_uid, **test_kwargs),
-            _aruba_row("wifi_data", **c, ts=ts, wifi_info=wifi_info, name=svc_name, service_uid=service_uid),
-        ]
-        append_aruba_rows(raw_path, rows)
+        # Both rows share the timestamp; format it once.
+        ts_str = _format_aruba_timestamp(ts)
+        pending_rows.extend([
+            _aruba_row(test_type, **c, ts_str=ts_str, name=svc_name, service_uid=service_uid, **test_kwargs),
+            _aruba_row("wifi_data", **c, ts_str=ts_str, wifi_info=wifi_info, name=svc_name, service_uid=service_uid),
+        ])
+        # Bound buffered memory on long per-network runs.
+        if len(pending_rows) >= 64:
+            flush_pending_rows()
     
     # Helper to add delay between tests (helps match Aruba UXI frequency)
     def test_delay() -> None:
@@ -3665,555 +4123,666 @@ def run_aruba_mode(
         if inter_test_delay > 0:
             time.sleep(inter_test_delay)
 
+    # Progress/freshness gauges are scraped at seconds granularity, so
+    # re-setting them after every sub-test is wasted work. Emit progress
+    # only when the integer percentage moves and the freshness timestamp
+    # at most once per second.
+    last_progress_emitted = -1
+    last_data_emitted = 0.0
+
+    def note_test_done(ts_epoch: float) -> None:
+        """Update completion/progress/freshness gauges for one finished test."""
+        nonlocal last_progress_emitted, last_data_emitted
+        tests_completed_gauge.set(tests_run)
+        progress = int(min(100, (tests_run / max(1, total_tests_estimate)) * 100))
+        if progress != last_progress_emitted:
+            progress_gauge.set(progress)
+            last_progress_emitted = progress
+        if ts_epoch - last_data_emitted >= 1.0:
+            last_data_gauge.set(ts_epoch)
+            last_data_emitted = ts_epoch
+
     # State tracking for Wi-Fi environment metrics (for stale cleanup)
     wifi_env_state: Dict[str, Any] = {}
     # State tracking for singleton info metrics (avoid duplicate time series)
     network_info_state: Dict[Any, Tuple[str, ...]] = {}
+    # BSSID info is singleton per network too: roaming would otherwise leave
+    # a stale series behind for every BSSID ever seen.
+    wifi_bssid_state: Dict[Any, Tuple[str, ...]] = {}
     
+    # Cycle-end metric children and last-emitted values, keyed by network
+    # alias; lets the end-of-cycle loop skip unchanged re-sets.
+    cycle_end_gauges: Dict[str, Tuple[Any, Any, Any]] = {}
+    cycle_end_values: Dict[str, Tuple[int, float]] = {}
+
+    # Sensor identity never changes at runtime; emit it once.
+    UXI_SENSOR_INFO.labels(sensor=sensor_name, model="UXI-Lite", serial=sensor_uid).set(1.0)
+
     # Continuous test cycle (Aruba UXI runs tests in round-robin, one at a time)
     cycle_num = 0
-    while True:
-        cycle_num += 1
-        cycle_start = time.time()
-        tests_run = 0
-        tests_skipped = 0
+    try:
+        while True:
+            cycle_num += 1
+            cycle_start = time.time()
+            tests_run = 0
+            tests_skipped = 0
         
-        # Calculate total expected tests for progress tracking
-        total_tests_estimate = 0
-        for network in networks:
-            # Core tests: ap_assoc (if wifi), dhcp, dns (x2)
-            total_tests_estimate += 1 if network.kind == "wifi" else 0  # ap_assoc
-            total_tests_estimate += 1  # dhcp
-            total_tests_estimate += 2  # dns primary + secondary
-        # Service tests (estimate - actual depends on frequency)
-        for scope, service in all_services:
-            tests = service.get("tests") or []
-            if "http" in tests:
-                total_tests_estimate += 2  # http80 + http443
-            if "tcp_80" in tests:
-                total_tests_estimate += 1
-            if "tcp_443" in tests:
-                total_tests_estimate += 1
-            if "icmp" in tests:
-                total_tests_estimate += 1
-            if "voip_mos" in tests:
-                total_tests_estimate += 1
-            if "throughput" in tests:
-                total_tests_estimate += 1
+            # Calculate total expected tests for progress tracking
+            total_tests_estimate = 0
+            for network in networks:
+                # Core tests: ap_assoc (if wifi), dhcp, dns (x2)
+                total_tests_estimate += 1 if network.kind == "wifi" else 0  # ap_assoc
+                total_tests_estimate += 1  # dhcp
+                total_tests_estimate += 2  # dns primary + secondary
+            # Service tests (estimate - actual depends on frequency)
+            for scope, service in all_services:
+                tests = service.get("tests") or []
+                if "http" in tests:
+                    total_tests_estimate += 2  # http80 + http443
+                if "tcp_80" in tests:
+                    total_tests_estimate += 1
+                if "tcp_443" in tests:
+                    total_tests_estimate += 1
+                if "icmp" in tests:
+                    total_tests_estimate += 1
+                if "voip_mos" in tests:
+                    total_tests_estimate += 1
+                if "throughput" in tests:
+                    total_tests_estimate += 1
         
-        for network in networks:
-            network_uid = get_or_create_network_uid(state, network)
-            network_alias = network.ssid or network.name
-            c = ctx(network_uid, network_alias, network.kind)
-            
-            # Initialize incident tracking for this network
-            aruba_steps: Dict[str, StepResult] = {}
-            aruba_service_results: List[Dict[str, Optional[float]]] = []
-            aruba_wifi_info: Optional[Dict[str, Any]] = None
-            aruba_captive_portal = False
+            for net_index, network in enumerate(networks):
+                # Wait for the previous network's background housekeeping
+                # before touching the interface again; it normally finishes
+                # during the inter-network delay.
+                if post_future is not None:
+                    post_future.result()
+                    post_future = None
+
+                network_uid = get_or_create_network_uid(state, network)
+                network_alias = network.ssid or network.name
+                c = ctx(network_uid, network_alias, network.kind)
+
+                # Bind the per-test hot gauges once; .labels() hashes its
+                # kwargs on every call and these are set after every test.
+                tests_completed_gauge = UXI_CYCLE_TESTS_COMPLETED.labels(
+                    sensor=sensor_name, network=network_alias
+                )
+                progress_gauge = UXI_CYCLE_PROGRESS.labels(
+                    sensor=sensor_name, network=network_alias
+                )
+                last_data_gauge = UXI_LAST_DATA_TIMESTAMP.labels(
+                    sensor=sensor_name, network=network_alias
+                )
+                last_progress_emitted = -1
+
+
+                # Initialize incident tracking for this network
+                aruba_steps: Dict[str, StepResult] = {}
+                aruba_service_results: List[Dict[str, Optional[float]]] = []
+                aruba_wifi_info: Optional[Dict[str, Any]] = None
+                aruba_captive_portal = False
             
-            # Set cycle info metrics
-            UXI_CYCLE_NUMBER.labels(sensor=sensor_name).set(cycle_num)
-            UXI_CYCLE_TESTS_TOTAL.labels(sensor=sensor_name, network=network_alias).set(total_tests_estimate)
+                # Set cycle info metrics
+                UXI_CYCLE_NUMBER.labels(sensor=sensor_name).set(cycle_num)
+                UXI_CYCLE_TESTS_TOTAL.labels(sensor=sensor_name, network=network_alias).set(total_tests_estimate)
 
-            # === CORE TESTS (always run every cycle) ===
+                # === CORE TESTS (always run every cycle) ===
             
-            # 1. AP Association (WiFi only)
-            if network.kind == "wifi":
-                set_current_test(network_alias, "ap_assoc", network.ssid or "", "WiFi Association")
-                ts = datetime.now()
-                assoc = step_wifi_association(
-                    iface=network.iface,
-                    ssid=network.ssid or "",
-                    password=network.password or "",
-                    force=True,
-                    eap_method=network.eap_method,
-                    phase2_auth=network.phase2_auth,
-                    identity=network.identity,
-                    anonymous_identity=network.anonymous_identity,
-                    bssid_lock=network.bssid_lock,
-                )
-                append_with_wifi(network, c, "ap_assoc", ts,
-                               elapsed_s=assoc.duration_ms / 1000.0 if assoc.duration_ms else 0.0)
-                
-                # Update Prometheus metric for dashboard
-                if assoc.duration_ms:
-                    UXI_AP_ASSOCIATION_TIME_MS.labels(sensor=sensor_name, network=network_alias).set(assoc.duration_ms)
+                # 1. AP Association (WiFi only)
+                if network.kind == "wifi":
+                    set_current_test(network_alias, "ap_assoc", network.ssid or "", "WiFi Association")
+                    ts_epoch = time.time()
+                    ts = datetime.fromtimestamp(ts_epoch)
+                    assoc = step_wifi_association(
+                        iface=network.iface,
+                        ssid=network.ssid or "",
+                        password=network.password or "",
+                        force=True,
+                        eap_method=network.eap_method,
+                        phase2_auth=network.phase2_auth,
+                        identity=network.identity,
+                        anonymous_identity=network.anonymous_identity,
+                        bssid_lock=network.bssid_lock,
+                    )
+                    append_with_wifi(network, c, "ap_assoc", ts,
+                                   elapsed_s=assoc.duration_ms / 1000.0 if assoc.duration_ms else 0.0)
                 
-                # Track for incident evaluation
-                aruba_steps["wifi_association"] = assoc
+                    # Update Prometheus metric for dashboard
+                    if assoc.duration_ms:
+                        UXI_AP_ASSOCIATION_TIME_MS.labels(sensor=sensor_name, network=network_alias).set(assoc.duration_ms)
                 
-                tests_run += 1
-                UXI_CYCLE_TESTS_COMPLETED.labels(sensor=sensor_name, network=network_alias).set(tests_run)
-                UXI_CYCLE_PROGRESS.labels(sensor=sensor_name, network=network_alias).set(
-                    min(100, (tests_run / max(1, total_tests_estimate)) * 100)
-                )
-                UXI_LAST_DATA_TIMESTAMP.labels(sensor=sensor_name, network=network_alias).set(time.time())
+                    # Track for incident evaluation
+                    aruba_steps["wifi_association"] = assoc
                 
-                # === UPDATE WIFI PROMETHEUS METRICS ===
-                wifi_info = _collect_wifi_info_for_aruba(network)
-                aruba_wifi_info = wifi_info  # Track for incident evaluation
-                if wifi_info:
-                    # RSSI (use rssi_dbm key from _parse_wifi_link)
-                    rssi = wifi_info.get("rssi_dbm")
-                    if rssi is not None:
-                        UXI_WIFI_RSSI_DBM.labels(sensor=sensor_name, network=network_alias).set(rssi)
+                    tests_run += 1
+                    note_test_done(ts_epoch)
+
+                    # === UPDATE WIFI PROMETHEUS METRICS ===
+                    wifi_info = _collect_wifi_info_for_aruba(network)
+                    aruba_wifi_info = wifi_info  # Track for incident evaluation
+                    if wifi_info:
+                        # RSSI (use rssi_dbm key from _parse_wifi_link)
+                        rssi = wifi_info.get("rssi_dbm")
+                        if rssi is not None:
+                            UXI_WIFI_RSSI_DBM.labels(sensor=sensor_name, network=network_alias).set(rssi)
                     
-                    channel = wifi_info.get("channel")
-                    if channel is not None:
-                        UXI_WIFI_CHANNEL.labels(sensor=sensor_name, network=network_alias).set(channel)
+                        channel = wifi_info.get("channel")
+                        if channel is not None:
+                            UXI_WIFI_CHANNEL.labels(sensor=sensor_name, network=network_alias).set(channel)
                     
-                    rx_bitrate = wifi_info.get("rx_bitrate_mbps")
-                    if rx_bitrate is not None:
-                        UXI_WIFI_RX_BITRATE_MBPS.labels(sensor=sensor_name, network=network_alias).set(rx_bitrate)
+                        rx_bitrate = wifi_info.get("rx_bitrate_mbps")
+                        if rx_bitrate is not None:
+                            UXI_WIFI_RX_BITRATE_MBPS.labels(sensor=sensor_name, network=network_alias).set(rx_bitrate)
                     
-                    tx_bitrate = wifi_info.get("tx_bitrate_mbps")
-                    if tx_bitrate is not None:
-                        UXI_WIFI_TX_BITRATE_MBPS.labels(sensor=sensor_name, network=network_alias).set(tx_bitrate)
+                        tx_bitrate = wifi_info.get("tx_bitrate_mbps")
+                        if tx_bitrate is not None:
+                            UXI_WIFI_TX_BITRATE_MBPS.labels(sensor=sensor_name, network=network_alias).set(tx_bitrate)
                     
-                    # Channel utilization (busy percentage)
-                    channel_busy = wifi_info.get("channel_busy_pct")
-                    if channel_busy is not None:
-                        UXI_WIFI_CHANNEL_BUSY_PCT.labels(sensor=sensor_name, network=network_alias).set(channel_busy)
+                        # Channel utilization (busy percentage)
+                        channel_busy = wifi_info.get("channel_busy_pct")
+                        if channel_busy is not None:
+                            UXI_WIFI_CHANNEL_BUSY_PCT.labels(sensor=sensor_name, network=network_alias).set(channel_busy)
                     
-                    # Client count (estimate from ARP table)
-                    client_count = get_wifi_client_count(network.iface)
-                    UXI_WIFI_CLIENT_COUNT.labels(sensor=sensor_name, network=network_alias).set(client_count)
+                        # Client count (estimate from ARP table)
+                        client_count = get_wifi_client_count(network.iface)
+                        UXI_WIFI_CLIENT_COUNT.labels(sensor=sensor_name, network=network_alias).set(client_count)
                     
-                    # WiFi frequency
-                    freq = wifi_info.get("freq_mhz") or 0
-                    if freq > 0:
-                        UXI_WIFI_FREQ_MHZ.labels(sensor=sensor_name, network=network_alias).set(freq)
-                        # WiFi band (use "2.4", "5", "6" to match dashboard variable)
-                        if freq >= 5950:
-                            band = "6"
-                        elif freq >= 5000:
-                            band = "5"
-                        else:
-                            band = "2.4"
-                        for band_label in ["2.4", "5", "6"]:
-                            UXI_WIFI_BAND.labels(sensor=sensor_name, network=network_alias, band=band_label).set(
-                                1.0 if band == band_label else 0.0
-                            )
+                        # WiFi frequency
+                        freq = wifi_info.get("freq_mhz") or 0
+                        if freq > 0:
+                            UXI_WIFI_FREQ_MHZ.labels(sensor=sensor_name, network=network_alias).set(freq)
+                            # WiFi band (use "2.4", "5", "6" to match dashboard variable)
+                            if freq >= 5950:
+                                band = "6"
+                            elif freq >= 5000:
+                                band = "5"
+                            else:
+                                band = "2.4"
+                            for band_label in ["2.4", "5", "6"]:
+                                UXI_WIFI_BAND.labels(sensor=sensor_name, network=network_alias, band=band_label).set(
+                                    1.0 if band == band_label else 0.0
+                                )
                     
-                    # BSSID info
-                    bssid = wifi_info.get("bssid") or "unknown"
-                    ssid = wifi_info.get("ssid") or network_alias
-                    UXI_WIFI_BSSID_INFO.labels(
-                        sensor=sensor_name, network=network_alias, bssid=bssid, ssid=ssid
-                    ).set(1.0)
+                        # BSSID info
+                        bssid = wifi_info.get("bssid") or "unknown"
+                        ssid = wifi_info.get("ssid") or network_alias
+                        _set_singleton_gauge(
+                            UXI_WIFI_BSSID_INFO,
+                            ["sensor", "network", "bssid", "ssid"],
+                            (sensor_name, network_alias, str(bssid), str(ssid)),
+                            wifi_bssid_state,
+                            (sensor_name, network_alias),
+                        )
                 
-                # NOTE: WiFi Environment Scan moved to END of cycle (after all service tests)
-                # to match Aruba UXI test order
+                    # NOTE: WiFi Environment Scan moved to END of cycle (after all service tests)
+                    # to match Aruba UXI test order
 
-            # 2. DHCP (Allocate IP) - Full DORA process per Aruba UXI behavior
-            # Per https://help.capenetworks.com/en/articles/1981280:
-            # "The sensor will do the full DHCP DORA process every time it joins a network"
-            set_current_test(network_alias, "dhcp", network.iface, "DHCP")
+                # 2. DHCP (Allocate IP) - Full DORA process per Aruba UXI behavior
+                # Per https://help.capenetworks.com/en/articles/1981280:
+                # "The sensor will do the full DHCP DORA process every time it joins a network"
+                set_current_test(network_alias, "dhcp", network.iface, "DHCP")
             
-            ts = datetime.now()
-            # Use full DORA request (matches Aruba UXI sensor behavior)
-            dhcp_res, ip_addr = request_dhcp_lease(network.iface, timeout_s=60)
-            append_with_wifi(network, c, "dhcp", ts,
-                           ip_address=ip_addr or "",
-                           elapsed_s=dhcp_res.duration_ms / 1000.0 if dhcp_res.duration_ms else 0.0)
+                ts_epoch = time.time()
+                ts = datetime.fromtimestamp(ts_epoch)
+                # Use full DORA request (matches Aruba UXI sensor behavior)
+                dhcp_res, ip_addr = request_dhcp_lease(network.iface, timeout_s=60)
+                append_with_wifi(network, c, "dhcp", ts,
+                               ip_address=ip_addr or "",
+                               elapsed_s=dhcp_res.duration_ms / 1000.0 if dhcp_res.duration_ms else 0.0)
             
-            # Update Prometheus metric for dashboard
-            if dhcp_res.duration_ms:
-                UXI_DHCP_TIME_MS.labels(sensor=sensor_name, network=network_alias).set(dhcp_res.duration_ms)
+                # Update Prometheus metric for dashboard
+                if dhcp_res.duration_ms:
+                    UXI_DHCP_TIME_MS.labels(sensor=sensor_name, network=network_alias).set(dhcp_res.duration_ms)
             
-            # Track for incident evaluation
-            aruba_steps["dhcp_ip"] = dhcp_res
+                # Track for incident evaluation
+                aruba_steps["dhcp_ip"] = dhcp_res
             
-            # Update network info metrics right after DHCP (when we have valid IP)
-            if ip_addr:
-                ip_config = get_ip_config_label(network.iface)
-                dhcp_server = get_dhcp_server(network.iface)
-                _, gateway = step_gateway_present(network.iface)
+                # Resolve DNS servers once per cycle; the DNS probes below
+                # reuse the same pair instead of re-running nmcli.
                 primary_dns, secondary_dns = get_dns_servers(network.iface)
-                wifi_mac = get_interface_mac(network.iface)
-                wifi_ip = ip_addr  # Use the IP we just got
+
+                # Update network info metrics right after DHCP (when we have valid IP)
+                if ip_addr:
+                    ip_config = get_ip_config_label(network.iface)
+                    dhcp_server = get_dhcp_server(network.iface)
+                    _, gateway = step_gateway_present(network.iface)
+                    wifi_mac = get_interface_mac(network.iface)
+                    wifi_ip = ip_addr  # Use the IP we just got
                 
-                _set_singleton_gauge(
-                    UXI_NETWORK_INFO,
-                    [
-                        "sensor",
-                        "network",
-                        "ip_config",
-                        "dhcp_server",
-                        "gateway",
-                        "primary_dns",
-                        "secondary_dns",
-                        "wifi_mac",
-                        "wifi_ip",
-                    ],
-                    (
-                        sensor_name,
-                        network_alias,
-                        ip_config or "DHCP",
-                        dhcp_server or "unknown",
-                        gateway or "unknown",
-                        primary_dns or "unknown",
-                        secondary_dns or "unknown",
-                        wifi_mac or "unknown",
-                        wifi_ip or "unknown",
-                    ),
-                    network_info_state,
-                    (sensor_name, network_alias),
-                )
+                    _set_singleton_gauge(
+                        UXI_NETWORK_INFO,
+                        [
+                            "sensor",
+                            "network",
+                            "ip_config",
+                            "dhcp_server",
+                            "gateway",
+                            "primary_dns",
+                            "secondary_dns",
+                            "wifi_mac",
+                            "wifi_ip",
+                        ],
+                        (
+                            sensor_name,
+                            network_alias,
+                            ip_config or "DHCP",
+                            dhcp_server or "unknown",
+                            gateway or "unknown",
+                            primary_dns or "unknown",
+                            secondary_dns or "unknown",
+                            wifi_mac or "unknown",
+                            wifi_ip or "unknown",
+                        ),
+                        network_info_state,
+                        (sensor_name, network_alias),
+                    )
                 
-                # Also update IP present metric
-                UXI_NETWORK_IP_PRESENT.labels(sensor=sensor_name, network=network_alias).set(1.0)
+                    # Also update IP present metric
+                    UXI_NETWORK_IP_PRESENT.labels(sensor=sensor_name, network=network_alias).set(1.0)
             
-            tests_run += 1
-            UXI_CYCLE_TESTS_COMPLETED.labels(sensor=sensor_name, network=network_alias).set(tests_run)
-            UXI_CYCLE_PROGRESS.labels(sensor=sensor_name, network=network_alias).set(
-                min(100, (tests_run / max(1, total_tests_estimate)) * 100)
-            )
-            UXI_LAST_DATA_TIMESTAMP.labels(sensor=sensor_name, network=network_alias).set(time.time())
-
-            # 3. DNS (Primary + Secondary)
-            primary_dns, secondary_dns = get_dns_servers(network.iface)
-            dns_worst_elapsed_ms: Optional[float] = None
-            for dns_server in [primary_dns, secondary_dns]:
-                if dns_server and dns_server != "unknown":
-                    set_current_test(network_alias, "dns", dns_server, "DNS Resolution")
-                    ts = datetime.now()
-                    elapsed = _dns_query_time_seconds(dns_domain, dns_server)
-                    append_with_wifi(network, c, "dns", ts, ip_address=dns_server, elapsed_s=elapsed)
-                    
-                    # Update Prometheus metric for dashboard (use last DNS result)
-                    if elapsed is not None:
-                        UXI_DNS_TIME_MS.labels(sensor=sensor_name, network=network_alias).set(elapsed * 1000)
-                        # Track worst DNS time for incident evaluation
-                        elapsed_ms = elapsed * 1000
-                        if dns_worst_elapsed_ms is None or elapsed_ms > dns_worst_elapsed_ms:
-                            dns_worst_elapsed_ms = elapsed_ms
-                    
-                    tests_run += 1
-                    UXI_CYCLE_TESTS_COMPLETED.labels(sensor=sensor_name, network=network_alias).set(tests_run)
-                    UXI_CYCLE_PROGRESS.labels(sensor=sensor_name, network=network_alias).set(
-                        min(100, (tests_run / max(1, total_tests_estimate)) * 100)
+                tests_run += 1
+                note_test_done(ts_epoch)
+
+                # 3. DNS (Primary + Secondary), servers resolved above.
+                # The two queries are independent, so fire them together and
+                # report in primary/secondary order; wall time is the worst
+                # resolver instead of the sum of both. Deduplicated: nmcli
+                # can hand back the same resolver twice, and two workers
+                # must not share one cached UDP socket (each would steal
+                # the other's reply).
+                dns_servers = list(
+                    dict.fromkeys(
+                        s for s in (primary_dns, secondary_dns) if s and s != "unknown"
                     )
-                    UXI_LAST_DATA_TIMESTAMP.labels(sensor=sensor_name, network=network_alias).set(time.time())
-            
-            # Track DNS result for incident evaluation
-            if dns_worst_elapsed_ms is not None:
-                aruba_steps["dns_resolve"] = StepResult(ok=True, duration_ms=dns_worst_elapsed_ms)
-
-            # === SERVICE TESTS (Internal + External) ===
-            # Aruba UXI test order: HTTP80 → TCP80 → HTTP443 → TCP443 → ICMP
-            # Each service respects its frequency setting
-            for scope, service in all_services:
-                svc_name = str(service.get("name") or "").strip()
-                svc_target = str(service.get("target") or "").strip()
-                tests = service.get("tests") or []
-                
-                # Skip if no name
-                if not svc_name:
-                    continue
-                
-                # For throughput-only services, target is optional (uses throughput_test.url)
-                # For other tests, target is required
-                is_throughput_only = tests == ["throughput"]
-                if not svc_target and not is_throughput_only:
-                    continue
-
-                # Check frequency - skip if not due yet
-                service_key = f"{scope}:{svc_name}:{svc_target}"
-                frequency_seconds = get_service_frequency_seconds(service)
-                
-                if not should_run_service(service_key, frequency_seconds, last_run_times):
-                    tests_skipped += 1
-                    continue
-                
-                # Mark service as run
-                last_run_times[service_key] = time.time()
-
-                host = _extract_host(svc_target)
-                service_uid = get_or_create_service_uid(state, scope, svc_name, svc_target)
-
-                # Port 80 tests (HTTP GET then TCP ping) - Aruba order
-                if "http" in tests:
-                    set_current_test(network_alias, "http_get", f"http://{host}:80", svc_name)
-                    ts = datetime.now()
-                    elapsed = _http_get_elapsed_seconds(f"http://{host}:80")
-                    append_with_wifi(network, c, "http_get", ts, svc_name, service_uid,
-                                   target=f"http://{host}:80", elapsed_s=elapsed)
-                    tests_run += 1
-                    UXI_CYCLE_TESTS_COMPLETED.labels(sensor=sensor_name, network=network_alias).set(tests_run)
-                    test_delay()
-
-                if "tcp_80" in tests:
-                    set_current_test(network_alias, "tcp_ping", f"{host}:80", svc_name)
-                    ts = datetime.now()
-                    latency, jitter, loss = _tcp_connect_stats(host, 80, attempts=10)
-                    append_with_wifi(network, c, "ping", ts, svc_name, service_uid,
-                                   target=f"{host}:80", latency=latency, jitter=jitter, packet_loss=loss)
-                    tests_run += 1
-                    UXI_CYCLE_TESTS_COMPLETED.labels(sensor=sensor_name, network=network_alias).set(tests_run)
-                    test_delay()
-
-                # Port 443 tests (HTTP GET then TCP ping) - Aruba order
-                if "http" in tests:
-                    set_current_test(network_alias, "http_get", f"https://{host}:443", svc_name)
-                    ts = datetime.now()
-                    elapsed = _http_get_elapsed_seconds(f"https://{host}:443")
-                    append_with_wifi(network, c, "http_get", ts, svc_name, service_uid,
-                                   target=f"https://{host}:443", elapsed_s=elapsed)
-                    tests_run += 1
-                    UXI_CYCLE_TESTS_COMPLETED.labels(sensor=sensor_name, network=network_alias).set(tests_run)
-                    test_delay()
-
-                if "tcp_443" in tests:
-                    set_current_test(network_alias, "tcp_ping", f"{host}:443", svc_name)
-                    ts = datetime.now()
-                    latency, jitter, loss = _tcp_connect_stats(host, 443, attempts=10)
-                    append_with_wifi(network, c, "ping", ts, svc_name, service_uid,
-                                   target=f"{host}:443", latency=latency, jitter=jitter, packet_loss=loss)
-                    tests_run += 1
-                    UXI_CYCLE_TESTS_COMPLETED.labels(sensor=sensor_name, network=network_alias).set(tests_run)
-                    test_delay()
-
-                # ICMP Ping (last, per Aruba order) - THIS IS THE MAIN SERVICE TEST
-                # RTT, jitter, packet_loss metrics come from this test
-                if "icmp" in tests:
-                    set_current_test(network_alias, "icmp_ping", host, svc_name)
-                    ts = datetime.now()
-                    ping_res = run_service_ping(host)
-                    append_with_wifi(network, c, "ping", ts, svc_name, service_uid,
-                                   target=host, latency=ping_res.get("rtt_avg_ms"),
-                                   jitter=ping_res.get("jitter_ms"), packet_loss=ping_res.get("loss_pct"))
-                    tests_run += 1
-                    UXI_CYCLE_TESTS_COMPLETED.labels(sensor=sensor_name, network=network_alias).set(tests_run)
-                    test_delay()
-                    
-                    # === UPDATE PROMETHEUS METRICS FOR DASHBOARD ===
-                    rtt = ping_res.get("rtt_avg_ms")
-                    jitter = ping_res.get("jitter_ms")
-                    loss = ping_res.get("loss_pct")
-                    
-                    svc_labels = {
-                        "sensor": sensor_name,
-                        "network": network_alias,
-                        "target": host,
-                        "scope": scope,
-                    }
-                    
-                    if rtt is not None:
-                        UXI_SERVICE_RTT_AVG_MS.labels(**svc_labels).set(rtt)
-                    if jitter is not None:
-                        UXI_SERVICE_JITTER_MS.labels(**svc_labels).set(jitter)
-                    if loss is not None:
-                        UXI_SERVICE_PACKET_LOSS_PCT.labels(**svc_labels).set(loss)
-                        # Service UP if packet loss < 100%
-                        is_up = 1.0 if loss < 100 else 0.0
-                        UXI_SERVICE_UP.labels(
-                            sensor=sensor_name, network=network_alias, 
-                            target=host, scope=scope, name=svc_name
-                        ).set(is_up)
+                )
+                dns_worst_elapsed_ms: Optional[float] = None
+                if dns_servers:
+                    set_current_test(network_alias, "dns", ", ".join(dns_servers), "DNS Resolution")
+                    ts_epoch = time.time()
+                    ts = datetime.fromtimestamp(ts_epoch)
+                    with concurrent.futures.ThreadPoolExecutor(max_workers=2) as pool:
+                        dns_futures = [
+                            pool.submit(_dns_query_time_seconds, dns_domain, server)
+                            for server in dns_servers
+                        ]
+                    for dns_server, future in zip(dns_servers, dns_futures):
+                        try:
+                            elapsed = future.result()
+                        except Exception:  # pylint: disable=broad-except
+                            LOG.debug("DNS query via %s failed", dns_server, exc_info=True)
+                            elapsed = None
+                        append_with_wifi(network, c, "dns", ts, ip_address=dns_server, elapsed_s=elapsed)
+
+                        # Update Prometheus metric for dashboard (use last DNS result)
+                        if elapsed is not None:
+                            UXI_DNS_TIME_MS.labels(sensor=sensor_name, network=network_alias).set(elapsed * 1000)
+                            # Track worst DNS time for incident evaluation
+                            elapsed_ms = elapsed * 1000
+                            if dns_worst_elapsed_ms is None or elapsed_ms > dns_worst_elapsed_ms:
+                                dns_worst_elapsed_ms = elapsed_ms
+
+                        tests_run += 1
+                        note_test_done(ts_epoch)
+
+                # Track DNS result for incident evaluation
+                if dns_worst_elapsed_ms is not None:
+                    aruba_steps["dns_resolve"] = StepResult(ok=True, duration_ms=dns_worst_elapsed_ms)
+
+                # === SERVICE TESTS (Internal + External) ===
+                # Aruba UXI test order: HTTP80 → TCP80 → HTTP443 → TCP443 → ICMP
+                # Each service respects its frequency setting
+                for scope, service in all_services:
+                    svc_name = service["_name"]
+                    svc_target = service["_target"]
+                    tests = service.get("tests") or []
+
+                    # Skip if no name
+                    if not svc_name:
+                        continue
+
+                    # For throughput-only services, target is optional (uses throughput_test.url)
+                    # For other tests, target is required
+                    is_throughput_only = tests == ["throughput"]
+                    if not svc_target and not is_throughput_only:
+                        continue
+
+                    # Check frequency - skip if not due yet
+                    if not should_run_service(service["_key"], service["_freq_s"], last_run_times):
+                        tests_skipped += 1
+                        continue
+
+                    # Mark service as run; this single clock reading is reused
+                    # for the probe-batch CSV timestamp and freshness gauges.
+                    svc_epoch = time.time()
+                    last_run_times[service["_key"]] = svc_epoch
+
+                    host = _extract_host(svc_target)
+                    service_uid = service["_uid"]
+
+                    # === Run the socket-bound probes for this service concurrently ===
+                    # HTTP80/TCP80/HTTP443/TCP443/ICMP/VoIP are independent and
+                    # spend their time waiting on the network, so fan them out
+                    # through a thread pool (same pattern as the throughput
+                    # workers) and emit rows in Aruba order below.
+                    probe_futures: Dict[str, Any] = {}
+                    probe_ts = datetime.fromtimestamp(svc_epoch)
+                    if any(t in tests for t in ("http", "tcp_80", "tcp_443", "icmp", "voip_mos")):
+                        set_current_test(network_alias, "service_probes", host, svc_name)
+                        if "http" in tests:
+                            probe_futures["http_80"] = probe_pool.submit(
+                                _http_get_elapsed_seconds, f"http://{host}:80"
+                            )
+                            probe_futures["http_443"] = probe_pool.submit(
+                                _http_get_elapsed_seconds, f"https://{host}:443"
+                            )
+                        if "tcp_80" in tests:
+                            probe_futures["tcp_80"] = probe_pool.submit(_tcp_connect_stats, host, 80, 10)
+                        if "tcp_443" in tests:
+                            probe_futures["tcp_443"] = probe_pool.submit(_tcp_connect_stats, host, 443, 10)
+                        if "icmp" in tests:
+                            probe_futures["icmp"] = probe_pool.submit(run_service_ping, host)
+                        if "voip_mos" in tests:
+                            # VoIP MOS derives from the same ICMP statistics;
+                            # reuse the icmp run instead of pinging the host a
+                            # second time in the same batch.
+                            probe_futures["voip_mos"] = probe_futures.get(
+                                "icmp"
+                            ) or probe_pool.submit(run_service_ping, host)
+
+                    probe_results: Dict[str, Any] = {}
+                    for probe_key, future in probe_futures.items():
+                        try:
+                            probe_results[probe_key] = future.result()
+                        except Exception:  # pylint: disable=broad-except
+                            LOG.debug("Probe %s failed for service %s", probe_key, svc_name, exc_info=True)
+                            probe_results[probe_key] = None
+
+                    # Port 80 tests (HTTP GET then TCP ping) - Aruba order
+                    if "http" in tests:
+                        append_with_wifi(network, c, "http_get", probe_ts, svc_name, service_uid,
+                                       target=f"http://{host}:80", elapsed_s=probe_results.get("http_80"))
+                        tests_run += 1
+
+                    if "tcp_80" in tests:
+                        latency, jitter, loss = probe_results.get("tcp_80") or (None, None, None)
+                        append_with_wifi(network, c, "ping", probe_ts, svc_name, service_uid,
+                                       target=f"{host}:80", latency=latency, jitter=jitter, packet_loss=loss)
+                        tests_run += 1
+
+                    # Port 443 tests (HTTP GET then TCP ping) - Aruba order
+                    if "http" in tests:
+                        append_with_wifi(network, c, "http_get", probe_ts, svc_name, service_uid,
+                                       target=f"https://{host}:443", elapsed_s=probe_results.get("http_443"))
+                        tests_run += 1
+
+                    if "tcp_443" in tests:
+                        latency, jitter, loss = probe_results.get("tcp_443") or (None, None, None)
+                        append_with_wifi(network, c, "ping", probe_ts, svc_name, service_uid,
+                                       target=f"{host}:443", latency=latency, jitter=jitter, packet_loss=loss)
+                        tests_run += 1
+
+                    # ICMP Ping (last, per Aruba order) - THIS IS THE MAIN SERVICE TEST
+                    # RTT, jitter, packet_loss metrics come from this test
+                    if "icmp" in tests:
+                        ping_res = probe_results.get("icmp") or {}
+                        append_with_wifi(network, c, "ping", probe_ts, svc_name, service_uid,
+                                       target=host, latency=ping_res.get("rtt_avg_ms"),
+                                       jitter=ping_res.get("jitter_ms"), packet_loss=ping_res.get("loss_pct"))
+                        tests_run += 1
                     
-                    UXI_SERVICE_LAST_TEST_TIMESTAMP.labels(**svc_labels).set(time.time())
-                    UXI_SERVICE_SCOPE.labels(**svc_labels).set(1.0)
+                        # === UPDATE PROMETHEUS METRICS FOR DASHBOARD ===
+                        rtt = ping_res.get("rtt_avg_ms")
+                        jitter = ping_res.get("jitter_ms")
+                        loss = ping_res.get("loss_pct")
                     
-                    # Track for incident evaluation
-                    aruba_service_results.append({
-                        "target": host,
-                        "scope": scope,
-                        "rtt_avg_ms": rtt,
-                        "jitter_ms": jitter,
-                        "loss_pct": loss,
-                    })
-
-                # VoIP MOS (uses ping test_type_code, MOS calculated from latency/jitter/loss)
-                if "voip_mos" in tests:
-                    set_current_test(network_alias, "voip_mos", host, svc_name)
-                    ts = datetime.now()
-                    ping_res = run_service_ping(host)
-                    append_with_wifi(network, c, "ping", ts, svc_name, service_uid,
-                                   target=host, latency=ping_res.get("rtt_avg_ms"),
-                                   jitter=ping_res.get("jitter_ms"), packet_loss=ping_res.get("loss_pct"))
-                    tests_run += 1
-                    UXI_CYCLE_TESTS_COMPLETED.labels(sensor=sensor_name, network=network_alias).set(tests_run)
-                    test_delay()
+                        rtt_g, jitter_g, loss_g, up_g, last_g, scope_g = _service_children(
+                            sensor_name, network_alias, host, scope, svc_name
+                        )
+                        if rtt is not None:
+                            rtt_g.set(rtt)
+                        if jitter is not None:
+                            jitter_g.set(jitter)
+                        if loss is not None:
+                            loss_g.set(loss)
+                            # Service UP if packet loss < 100%
+                            up_g.set(1.0 if loss < 100 else 0.0)
+
+                        last_g.set(svc_epoch)
+                        scope_g.set(1.0)
                     
-                    # Calculate MOS score and update metrics
-                    rtt = ping_res.get("rtt_avg_ms") or 0
-                    jitter = ping_res.get("jitter_ms") or 0
-                    loss = ping_res.get("loss_pct") or 0
-                    mos = compute_voip_mos(rtt, loss, jitter)
-                    if mos is not None:
-                        UXI_VOIP_MOS.labels(sensor=sensor_name, network=network_alias, scope=scope).set(mos)
-
-                # Throughput test
-                # Aruba UXI runs Fast.com via headless Chromium; UXI-Lite can use Fast.com API directly
-                # (method=fastcom) or run a URL-based test (method=http).
-                if "throughput" in tests and throughput_cfg.get("enabled"):
-                    set_current_test(network_alias, "throughput", "speed.test", svc_name)
-                    ts = datetime.now()
-                    timeout_s = int(throughput_cfg.get("timeout_s") or 20)
-                    download_speed, upload_speed, elapsed = run_throughput_test(
-                        throughput_cfg, timeout_s=timeout_s
-                    )
+                        # Track for incident evaluation
+                        aruba_service_results.append({
+                            "target": host,
+                            "scope": scope,
+                            "rtt_avg_ms": rtt,
+                            "jitter_ms": jitter,
+                            "loss_pct": loss,
+                        })
+
+                    # VoIP MOS (uses ping test_type_code, MOS calculated from latency/jitter/loss)
+                    if "voip_mos" in tests:
+                        ping_res = probe_results.get("voip_mos") or {}
+                        append_with_wifi(network, c, "ping", probe_ts, svc_name, service_uid,
+                                       target=host, latency=ping_res.get("rtt_avg_ms"),
+                                       jitter=ping_res.get("jitter_ms"), packet_loss=ping_res.get("loss_pct"))
+                        tests_run += 1
                     
-                    # Update Prometheus metrics for dashboard display
-                    if download_speed is not None:
-                        UXI_THROUGHPUT_DOWNLOAD_MBPS.labels(
-                            sensor=sensor_name,
-                            network=network_alias,
-                            target=svc_name,
-                        ).set(download_speed)
-                    if upload_speed is not None:
-                        UXI_THROUGHPUT_UPLOAD_MBPS.labels(
-                            sensor=sensor_name,
-                            network=network_alias,
-                            target=svc_name,
-                        ).set(upload_speed)
-
-                    if download_speed is not None or upload_speed is not None:
-                        LOG.info(
-                            "Throughput test %s: download=%s Mbps upload=%s Mbps (elapsed=%.1fs)",
-                            svc_name,
-                            f"{download_speed:.2f}" if download_speed is not None else "NA",
-                            f"{upload_speed:.2f}" if upload_speed is not None else "NA",
-                            elapsed or 0,
+                        # Calculate MOS score and update metrics
+                        rtt = ping_res.get("rtt_avg_ms") or 0
+                        jitter = ping_res.get("jitter_ms") or 0
+                        loss = ping_res.get("loss_pct") or 0
+                        mos = compute_voip_mos(rtt, loss, jitter)
+                        if mos is not None:
+                            UXI_VOIP_MOS.labels(sensor=sensor_name, network=network_alias, scope=scope).set(mos)
+
+                    # One pacing delay per service batch (probes within the
+                    # batch already overlapped).
+                    if probe_futures:
+                        test_delay()
+
+                    # Throughput test
+                    # Aruba UXI runs Fast.com via headless Chromium; UXI-Lite can use Fast.com API directly
+                    # (method=fastcom) or run a URL-based test (method=http).
+                    if "throughput" in tests and throughput_cfg.get("enabled"):
+                        set_current_test(network_alias, "throughput", "speed.test", svc_name)
+                        ts_epoch = time.time()
+                        ts = datetime.fromtimestamp(ts_epoch)
+                        timeout_s = int(throughput_cfg.get("timeout_s") or 20)
+                        download_speed, upload_speed, elapsed = run_throughput_test(
+                            throughput_cfg, timeout_s=timeout_s
                         )
+                    
+                        # Update Prometheus metrics for dashboard display
+                        if download_speed is not None:
+                            UXI_THROUGHPUT_DOWNLOAD_MBPS.labels(
+                                sensor=sensor_name,
+                                network=network_alias,
+                                target=svc_name,
+                            ).set(download_speed)
+                        if upload_speed is not None:
+                            UXI_THROUGHPUT_UPLOAD_MBPS.labels(
+                                sensor=sensor_name,
+                                network=network_alias,
+                                target=svc_name,
+                            ).set(upload_speed)
+
+                        if download_speed is not None or upload_speed is not None:
+                            LOG.info(
+                                "Throughput test %s: download=%s Mbps upload=%s Mbps (elapsed=%.1fs)",
+                                svc_name,
+                                f"{download_speed:.2f}" if download_speed is not None else "NA",
+                                f"{upload_speed:.2f}" if upload_speed is not None else "NA",
+                                elapsed or 0,
+                            )
                         
-                        # === WRITE THROUGHPUT TO CSV (Aruba UXI compatible) ===
-                        append_with_wifi(
-                            network, c, "throughput", ts,
-                            svc_name=svc_name,
-                            service_uid=service_uid,
-                            download_speed=download_speed,
-                            upload_speed=upload_speed,
-                            elapsed_s=elapsed,
-                        )
-                    else:
-                        LOG.warning("Throughput test %s: FAILED", svc_name)
-                    tests_run += 1
-                    UXI_CYCLE_TESTS_COMPLETED.labels(sensor=sensor_name, network=network_alias).set(tests_run)
+                            # === WRITE THROUGHPUT TO CSV (Aruba UXI compatible) ===
+                            append_with_wifi(
+                                network, c, "throughput", ts,
+                                svc_name=svc_name,
+                                service_uid=service_uid,
+                                download_speed=download_speed,
+                                upload_speed=upload_speed,
+                                elapsed_s=elapsed,
+                            )
+                        else:
+                            LOG.warning("Throughput test %s: FAILED", svc_name)
+                        tests_run += 1
                 
-                # Update progress
-                UXI_CYCLE_PROGRESS.labels(sensor=sensor_name, network=network_alias).set(
-                    min(100, (tests_run / max(1, total_tests_estimate)) * 100)
-                )
-                UXI_LAST_DATA_TIMESTAMP.labels(sensor=sensor_name, network=network_alias).set(time.time())
-
-            # === WIFI ENVIRONMENT SCAN (at end of cycle per Aruba UXI order) ===
-            if network.kind == "wifi":
-                wifi_env_cfg = get_wifi_env_config(cfg)
-                if wifi_env_cfg.get("enabled", False):
-                    set_current_test(network_alias, "wifi_scan", network.iface, "WiFi Environment Scan")
-                    wifi_env = collect_wifi_environment(network.iface, wifi_env_cfg)
-                    if wifi_env:
-                        update_wifi_environment_metrics(
-                            sensor_name=sensor_name,
-                            network_name=network_alias,
-                            iface=network.iface,
-                            wifi_env=wifi_env,
-                            config=wifi_env_cfg,
-                            env_state=wifi_env_state,
-                        )
+                    # Update completion/progress once per service batch
+                    note_test_done(svc_epoch)
+
+                # === WIFI ENVIRONMENT SCAN (at end of cycle per Aruba UXI order) ===
+                if network.kind == "wifi":
+                    wifi_env_cfg = get_wifi_env_config(cfg)
+                    if wifi_env_cfg.get("enabled", False):
+                        set_current_test(network_alias, "wifi_scan", network.iface, "WiFi Environment Scan")
+                        wifi_env = collect_wifi_environment(network.iface, wifi_env_cfg)
+                        if wifi_env:
+                            update_wifi_environment_metrics(
+                                sensor_name=sensor_name,
+                                network_name=network_alias,
+                                iface=network.iface,
+                                wifi_env=wifi_env,
+                                config=wifi_env_cfg,
+                                env_state=wifi_env_state,
+                            )
                         
-                        # Update channel busy percentage from environment scan
-                        wifi_info = _collect_wifi_info_for_aruba(network)
-                        current_channel = wifi_info.get("channel") if wifi_info else None
-                        if current_channel:
-                            channel_aps = [ap for ap in wifi_env if ap.get("channel") == current_channel]
-                            if channel_aps:
-                                busy_estimate = min(100.0, len(channel_aps) * 10.0)
-                                UXI_WIFI_CHANNEL_BUSY_PCT.labels(
-                                    sensor=sensor_name, network=network_alias
-                                ).set(busy_estimate)
+                            # Update channel busy percentage from environment scan
+                            wifi_info = _collect_wifi_info_for_aruba(network)
+                            current_channel = wifi_info.get("channel") if wifi_info else None
+                            if current_channel:
+                                channel_ap_count = sum(
+                                    1 for ap in wifi_env if ap.get("channel") == current_channel
+                                )
+                                if channel_ap_count:
+                                    busy_estimate = min(100.0, channel_ap_count * 10.0)
+                                    UXI_WIFI_CHANNEL_BUSY_PCT.labels(
+                                        sensor=sensor_name, network=network_alias
+                                    ).set(busy_estimate)
                         
-                        # Update client count
-                        UXI_WIFI_CLIENT_COUNT.labels(sensor=sensor_name, network=network_alias).set(len(wifi_env))
-
-            # === INCIDENT EVALUATION AND METRICS UPDATE ===
-            incident_flags = evaluate_incidents(
-                steps=aruba_steps,
-                service_results=aruba_service_results,
-                thresholds=incident_thresholds,
-                wifi_info=aruba_wifi_info,
-                captive_portal=aruba_captive_portal,
-            )
-            newly_resolved = update_incident_state(
-                sensor_name=sensor_name,
-                network_name=network_alias,
-                active_flags=incident_flags,
-                state=incident_state,
-            )
-            for inc_type, _event in newly_resolved:
-                UXI_INCIDENTS_RESOLVED_TOTAL.labels(
-                    sensor=sensor_name, network=network_alias, type=inc_type
-                ).inc()
-            update_incident_metrics(
-                sensor_name=sensor_name,
-                network_name=network_alias,
-                active_flags=incident_flags,
-                state=incident_state,
-                metrics_state=incident_metrics_state,
-            )
-            save_incident_state(incident_state_path, incident_state)
+                            # Update client count
+                            UXI_WIFI_CLIENT_COUNT.labels(sensor=sensor_name, network=network_alias).set(len(wifi_env))
+
+                # === INCIDENT EVALUATION AND METRICS UPDATE ===
+                incident_flags = evaluate_incidents(
+                    steps=aruba_steps,
+                    service_results=aruba_service_results,
+                    thresholds=incident_thresholds,
+                    wifi_info=aruba_wifi_info,
+                    captive_portal=aruba_captive_portal,
+                )
+                newly_resolved = update_incident_state(
+                    sensor_name=sensor_name,
+                    network_name=network_alias,
+                    active_flags=incident_flags,
+                    state=incident_state,
+                )
+                for inc_type, _event in newly_resolved:
+                    UXI_INCIDENTS_RESOLVED_TOTAL.labels(
+                        sensor=sensor_name, network=network_alias, type=inc_type
+                    ).inc()
+                update_incident_metrics(
+                    sensor_name=sensor_name,
+                    network_name=network_alias,
+                    active_flags=incident_flags,
+                    state=incident_state,
+                    metrics_state=incident_metrics_state,
+                )
+                # Flush buffered CSV rows now; the state saves and lease
+                # release below run on the housekeeping worker (snapshots
+                # keep them isolated from next-network mutations).
+                flush_pending_rows()
+                incident_snapshot = copy.deepcopy(incident_state)
+                state_snapshot = copy.deepcopy(state)
+
+                def post_network_housekeeping(
+                    net: NetworkConfig = network,
+                    alias: str = network_alias,
+                    incidents: Dict[str, Any] = incident_snapshot,
+                    aruba_state: Dict[str, Any] = state_snapshot,
+                ) -> None:
+                    """Persist state and release the lease off the hot path."""
+                    save_incident_state(incident_state_path, incidents)
+                    save_aruba_state(cfg.get("aruba_state_path", ARUBA_STATE_PATH), aruba_state)
+                    # Per Aruba UXI behavior: "The sensor explicitly releases the IP when
+                    # finished testing a network" - https://help.capenetworks.com/en/articles/1981280
+                    # NOTE: Network info has already been saved to Prometheus metrics, so releasing
+                    # the IP here won't affect dashboard display (metrics persist)
+                    if net.kind == "wifi":
+                        release_dhcp_lease(net.iface)
+                        LOG.debug("Released DHCP lease for WiFi network %s after testing", alias)
+                    elif net.kind == "ethernet":
+                        # For ethernet, we don't release to maintain connectivity for sensor management
+                        # This matches typical enterprise deployment where sensor needs persistent LAN access
+                        LOG.debug("Keeping ethernet connection for %s (management network)", alias)
+
+                post_future = post_pool.submit(post_network_housekeeping)
+
+                # Small delay between networks; housekeeping above overlaps
+                # it. After the last network the cycle-end work (and any
+                # inter-cycle delay) provides the pacing, so skip the sleep.
+                if net_index < len(networks) - 1:
+                    time.sleep(2)
+
+            # Test cycle complete - clear current test indicator
+            clear_current_test()
 
-            # Save state after completing all tests for this network
-            save_aruba_state(cfg.get("aruba_state_path", ARUBA_STATE_PATH), state)
-            
-            # Per Aruba UXI behavior: "The sensor explicitly releases the IP when 
-            # finished testing a network" - https://help.capenetworks.com/en/articles/1981280
-            # NOTE: Network info has already been saved to Prometheus metrics, so releasing
-            # the IP here won't affect dashboard display (metrics persist)
-            if network.kind == "wifi":
-                release_dhcp_lease(network.iface)
-                LOG.debug("Released DHCP lease for WiFi network %s after testing", network_alias)
-            elif network.kind == "ethernet":
-                # For ethernet, we don't release to maintain connectivity for sensor management
-                # This matches typical enterprise deployment where sensor needs persistent LAN access
-                LOG.debug("Keeping ethernet connection for %s (management network)", network_alias)
-            
-            # Small delay between networks
-            time.sleep(2)
+            cycle_duration = time.time() - cycle_start
+            LOG.info(
+                "Cycle #%d complete: %d tests run, %d skipped (frequency), duration=%.1fs",
+                cycle_num, tests_run, tests_skipped, cycle_duration
+            )
 
-        # Test cycle complete - clear current test indicator
-        clear_current_test()
-        
-        # Set progress to 100%
-        for network in networks:
-            network_alias = network.ssid or network.name
-            UXI_CYCLE_PROGRESS.labels(sensor=sensor_name, network=network_alias).set(100)
-        
-        cycle_duration = time.time() - cycle_start
-        LOG.info(
-            "Cycle #%d complete: %d tests run, %d skipped (frequency), duration=%.1fs",
-            cycle_num, tests_run, tests_skipped, cycle_duration
-        )
-        
-        # === UPDATE CORE METRICS FOR DASHBOARD ===
-        cycle_time_ms = int(cycle_duration * 1000)
-        for network in networks:
-            network_alias = network.ssid or network.name
-            
-            # Core status - 1 if we completed without error
-            UXI_CORE_OK.labels(sensor=sensor_name, network=network_alias, step="cycle").set(1.0)
-            UXI_CORE_TIME_MS.labels(sensor=sensor_name, network=network_alias, step="cycle").set(cycle_time_ms)
-            
-            # Connection quality score (based on service test results)
-            # Simple calculation: 100% if all tests passed, reduced by failures
-            quality_score = 100.0
-            if tests_run > 0:
-                # Estimate based on cycle completion
-                quality_score = min(100.0, max(0.0, 100.0 * (tests_run / max(1, total_tests_estimate))))
-            UXI_CONNECTION_QUALITY_SCORE.labels(sensor=sensor_name, network=network_alias).set(quality_score)
-            
-            # Sensor info
-            UXI_SENSOR_INFO.labels(sensor=sensor_name, model="UXI-Lite", serial=sensor_uid).set(1.0)
+            # === UPDATE CORE METRICS FOR DASHBOARD ===
+            # Children are bound once per network and values re-emitted only
+            # when they changed; UXI_CORE_OK and the sensor-info series are
+            # constant after their first set.
+            cycle_time_ms = int(cycle_duration * 1000)
+            for network in networks:
+                network_alias = network.ssid or network.name
+
+                gauges = cycle_end_gauges.get(network_alias)
+                if gauges is None:
+                    gauges = (
+                        UXI_CYCLE_PROGRESS.labels(sensor=sensor_name, network=network_alias),
+                        UXI_CORE_TIME_MS.labels(sensor=sensor_name, network=network_alias, step="cycle"),
+                        UXI_CONNECTION_QUALITY_SCORE.labels(sensor=sensor_name, network=network_alias),
+                    )
+                    cycle_end_gauges[network_alias] = gauges
+                    # Core status - 1 if we completed without error
+                    UXI_CORE_OK.labels(sensor=sensor_name, network=network_alias, step="cycle").set(1.0)
+                progress_g, cycle_time_g, quality_g = gauges
+                progress_g.set(100)
+
+                # Connection quality score (based on service test results)
+                # Simple calculation: 100% if all tests passed, reduced by failures
+                quality_score = 100.0
+                if tests_run > 0:
+                    # Estimate based on cycle completion
+                    quality_score = min(100.0, max(0.0, 100.0 * (tests_run / max(1, total_tests_estimate))))
+
+                if cycle_end_values.get(network_alias) != (cycle_time_ms, quality_score):
+                    cycle_time_g.set(cycle_time_ms)
+                    quality_g.set(quality_score)
+                    cycle_end_values[network_alias] = (cycle_time_ms, quality_score)
         
-        # Optional delay between cycles (Aruba agents use 5 min, sensors default to 0)
-        if inter_cycle_delay > 0:
-            set_current_test("-", "waiting", "-", f"Inter-cycle delay ({inter_cycle_delay}s)")
-            LOG.info("Waiting %d seconds before next cycle...", inter_cycle_delay)
-            time.sleep(inter_cycle_delay)
-            clear_current_test()
+            # Optional delay between cycles (Aruba agents use 5 min, sensors default to 0)
+            if inter_cycle_delay > 0:
+                set_current_test("-", "waiting", "-", f"Inter-cycle delay ({inter_cycle_delay}s)")
+                LOG.info("Waiting %d seconds before next cycle...", inter_cycle_delay)
+                time.sleep(inter_cycle_delay)
+                clear_current_test()
+    finally:
+        # Never drop buffered rows on shutdown or an unexpected error.
+        flush_pending_rows()
+        probe_pool.shutdown(wait=False)
+        # Let in-flight housekeeping finish so state on disk is current.
+        if post_future is not None:
+            try:
+                post_future.result()
+            except Exception:  # pylint: disable=broad-except
+                LOG.debug("Post-network housekeeping failed", exc_info=True)
+        post_pool.shutdown(wait=True)
 
 
 def run_tests(
@@ -4309,6 +4878,10 @@ def run_tests(
     return steps, ip_address, gateway, wifi_info, service_results, wifi_env
 
 
+# Subset of parse_wifi_scan_output fields that goes into the JSONL record.
+_WIFI_ENV_RECORD_KEYS = ("ssid", "bssid", "rssi_dbm", "channel", "width_mhz", "band")
+
+
 def build_record(
     sensor_name: str,
     network: NetworkConfig,
@@ -4337,7 +4910,9 @@ def build_record(
         JSON-serializable record.
     """
     record: Dict[str, Any] = {
-        "timestamp": datetime.now(timezone.utc).isoformat(),
+        # Left as a datetime: orjson serializes it natively (C fast path)
+        # and the stdlib fallback renders isoformat via _json_default.
+        "timestamp": datetime.now(timezone.utc),
         "sensor_name": sensor_name,
         "network_name": network.name,
         "network_type": network.kind,
@@ -4365,15 +4940,11 @@ def build_record(
     if service_results:
         record["services"] = service_results
     if wifi_env:
+        # Project the strongest APs onto the record schema. The parser
+        # guarantees these keys, so direct indexing skips a .get() call
+        # per field per AP.
         record["wifi_environment"] = [
-            {
-                "ssid": ap.get("ssid"),
-                "bssid": ap.get("bssid"),
-                "rssi_dbm": ap.get("rssi_dbm"),
-                "channel": ap.get("channel"),
-                "width_mhz": ap.get("width_mhz"),
-                "band": ap.get("band"),
-            }
+            {key: ap[key] for key in _WIFI_ENV_RECORD_KEYS}
             for ap in wifi_env[:20]
         ]
     if triage_data:
@@ -4399,6 +4970,8 @@ def parse_args() -> argparse.Namespace:
 
 def main() -> None:
     """Entrypoint for the exporter."""
+    import concurrent.futures
+
     logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
 
     if os.geteuid() != 0:
@@ -4417,6 +4990,12 @@ def main() -> None:
     internal_target_set = set(internal_icmp_targets)
     internal_target_set.add("gateway")
     external_target_set = set(external_icmp_targets)
+    # Target list is fixed after config load, so the MOS/quality target
+    # pick is loop-invariant.
+    external_target = select_external_target(external_icmp_targets)
+    captive_portal_ttl_s = float(
+        cfg.get("captive_portal_ttl_seconds", CAPTIVE_PORTAL_TTL_S)
+    )
     wifi_env_cfg = get_wifi_env_config(cfg)
     wifi_env_state: Dict[str, Any] = {"ap_last_seen": {}, "channel_keys": set()}
     incident_thresholds = get_incident_thresholds(cfg)
@@ -4450,10 +5029,110 @@ def main() -> None:
         run_aruba_mode(cfg=cfg, sensor_name=sensor_name, networks=networks)
         return
 
+    # Bind the per-interval hot children once per network; .labels()
+    # re-hashes its kwargs and takes a lock on every call.
+    loop_gauges: Dict[str, Tuple[Any, Any]] = {
+        net.name: (
+            UXI_CAPTIVE_PORTAL_DETECTED.labels(sensor=sensor_name, network=net.name),
+            UXI_CONNECTION_QUALITY_SCORE.labels(sensor=sensor_name, network=net.name),
+        )
+        for net in networks
+    }
+    resolved_counters: Dict[Tuple[str, str], Any] = {}
+
+    # Each network's kind is fixed for the process lifetime, so resolve the
+    # wifi/wired branch into a per-network hook once instead of re-testing
+    # it every cycle. Wired networks get a no-op.
+    def _make_wifi_hook(net: NetworkConfig) -> Any:
+        if net.kind != "wifi":
+            return lambda wifi_env: None
+        net_name = net.name
+        net_iface = net.iface
+
+        def wifi_hook(wifi_env: List[Dict[str, Any]]) -> None:
+            update_wifi_environment_metrics(
+                sensor_name=sensor_name,
+                network_name=net_name,
+                iface=net_iface,
+                wifi_env=wifi_env,
+                config=wifi_env_cfg,
+                env_state=wifi_env_state,
+            )
+
+        return wifi_hook
+
+    post_probe_hooks: Dict[str, Any] = {net.name: _make_wifi_hook(net) for net in networks}
+
+    # Deadline-based schedule: sleeping a fixed interval after the work
+    # phase lets the cadence drift by the work duration every cycle.
+    next_tick = time.monotonic()
+
+    # Overlaps the captive-portal HTTP round trip with info collection.
+    io_pool = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="io")
+
+    # End-of-cycle disk writes go through a bounded queue drained by one
+    # writer thread, so a storage hiccup stalls the writer, not the probe
+    # cadence. On overflow, JSONL measurement records are shed (counted;
+    # their loss is permanent) while incident-state snapshots are kept —
+    # except an older snapshot superseded by a newer one being enqueued.
+    writer_q: queue.Queue = queue.Queue(maxsize=1024)
+    dropped_counter = UXI_WRITER_QUEUE_DROPPED_TOTAL.labels(sensor=sensor_name)
+
+    def _drain_writer_queue() -> None:
+        while True:
+            kind, payload = writer_q.get()
+            try:
+                if kind == "jsonl":
+                    write_jsonl(log_path, payload)
+                else:
+                    save_incident_state(incident_state_path, payload)
+            except Exception:  # pylint: disable=broad-except
+                LOG.warning("Writer thread %s write failed", kind, exc_info=True)
+            finally:
+                writer_q.task_done()
+
+    def _enqueue_write(kind: str, payload: Any) -> None:
+        while True:
+            try:
+                writer_q.put_nowait((kind, payload))
+                return
+            except queue.Full:
+                try:
+                    old_kind, old_payload = writer_q.get_nowait()
+                except queue.Empty:
+                    continue
+                writer_q.task_done()
+                if old_kind == "state" and kind == "jsonl":
+                    # Never trade a state snapshot for a record: keep the
+                    # snapshot and drop the incoming record instead.
+                    try:
+                        writer_q.put_nowait((old_kind, old_payload))
+                    except queue.Full:
+                        pass
+                    dropped_counter.inc()
+                    LOG.warning("Writer queue full; dropped JSONL record")
+                    return
+                if old_kind == "jsonl":
+                    dropped_counter.inc()
+                    LOG.warning("Writer queue full; shed oldest JSONL record")
+                # else: an older snapshot superseded by the incoming one.
+
+    writer_thread = threading.Thread(
+        target=_drain_writer_queue, name="writer", daemon=True
+    )
+    writer_thread.start()
+
+    # collect_network_info shells out per call; its inputs only change on
+    # DHCP renewal, so reuse the last result while they hold steady.
+    last_net_key: Optional[Tuple[Optional[str], Optional[str], str]] = None
+    last_net_info: Optional[Dict[str, str]] = None
+
     index = 0
     while True:
         network = networks[index % len(networks)]
         index += 1
+        net_name = network.name
+        captive_gauge, quality_gauge = loop_gauges[net_name]
 
         try:
             steps, ip_address, gateway, wifi_info, service_results, wifi_env = run_tests(
@@ -4470,6 +5149,14 @@ def main() -> None:
             service_results = run_service_tests(icmp_targets, False)
             wifi_env = []
 
+        # The captive-portal probe is a blocking HTTP round trip; start it
+        # now so it overlaps the subprocess-based collection below.
+        cp_future = (
+            io_pool.submit(detect_captive_portal_cached, captive_portal_ttl_s)
+            if ip_address
+            else None
+        )
+
         failed_steps = [name for name, result in steps.items() if not result.ok]
         triage_data = None
         if failed_steps:
@@ -4480,61 +5167,47 @@ def main() -> None:
             )
 
         location_cfg = get_location_config(cfg, wifi_env)
-        network_info = collect_network_info(network, ip_address, gateway)
-        update_info_metrics(
-            sensor_name=sensor_name,
-            network=network,
-            network_info=network_info,
-            sensor_model=sensor_model,
-            sensor_serial=sensor_serial,
-            location_cfg=location_cfg,
-            info_state=info_state,
-        )
-
-        # Captive portal detection
-        captive_portal_detected = False
-        if ip_address:
-            captive_portal_detected = detect_captive_portal()
-        UXI_CAPTIVE_PORTAL_DETECTED.labels(
-            sensor=sensor_name, network=network.name
-        ).set(1.0 if captive_portal_detected else 0.0)
+        net_key = (ip_address, gateway, net_name)
+        if net_key == last_net_key and last_net_info is not None:
+            network_info = last_net_info
+        else:
+            network_info = collect_network_info(network, ip_address, gateway)
+            last_net_key = net_key
+            last_net_info = network_info
+
+        # Captive portal detection (started above)
+        captive_portal_detected = bool(cp_future.result()) if cp_future else False
+        captive_gauge.set(1.0 if captive_portal_detected else 0.0)
+
+        # Index results by target once; find_service_result scans linearly
+        # and is consulted three times per cycle. First result wins,
+        # matching the linear scan's behavior on duplicate targets.
+        service_by_target: Dict[str, Dict[str, Optional[float]]] = {}
+        for result in service_results:
+            result_target = result.get("target")
+            if result_target and result_target not in service_by_target:
+                service_by_target[result_target] = result
 
         # Connection quality score
-        external_target = select_external_target(external_icmp_targets)
-        external_result = find_service_result(service_results, external_target)
+        external_result = service_by_target.get(external_target)
         rssi = wifi_info.get("rssi_dbm") if wifi_info else None
-        rtt = external_result.get("rtt_avg_ms") if external_result else None
-        loss = external_result.get("loss_pct") if external_result else None
-        jitter = external_result.get("jitter_ms") if external_result else None
-        quality_score = calculate_connection_quality_score(
-            rssi_dbm=rssi,
-            rtt_ms=rtt,
-            loss_pct=loss,
-            jitter_ms=jitter,
-            throughput_mbps=None,  # Throughput test only in Aruba mode
-        )
-        UXI_CONNECTION_QUALITY_SCORE.labels(
-            sensor=sensor_name, network=network.name
-        ).set(quality_score)
-
-        update_metrics(
-            sensor_name=sensor_name,
-            network_name=network.name,
-            steps=steps,
-            ip_present=bool(ip_address),
-            wifi_info=wifi_info,
-            service_results=service_results,
-            internal_targets=internal_target_set,
-            external_targets=external_target_set,
-            wifi_bssid_state=wifi_bssid_state,
-        )
-
-        update_voip_mos_metrics(
-            sensor_name=sensor_name,
-            network_name=network.name,
-            internal_result=find_service_result(service_results, "gateway"),
-            external_result=find_service_result(service_results, external_target),
-        )
+        if external_result is None and rssi is None:
+            # Outage short-circuit: with no inputs at all the weighted
+            # math returns 0.0 anyway, and this is exactly the state the
+            # loop spends the most time in when the network is down.
+            quality_score = 0.0
+        else:
+            rtt = external_result.get("rtt_avg_ms") if external_result else None
+            loss = external_result.get("loss_pct") if external_result else None
+            jitter = external_result.get("jitter_ms") if external_result else None
+            quality_score = calculate_connection_quality_score(
+                rssi_dbm=rssi,
+                rtt_ms=rtt,
+                loss_pct=loss,
+                jitter_ms=jitter,
+                throughput_mbps=None,  # Throughput test only in Aruba mode
+            )
+        quality_gauge.set(quality_score)
 
         incident_flags = evaluate_incidents(
             steps=steps,
@@ -4545,32 +5218,47 @@ def main() -> None:
         )
         newly_resolved = update_incident_state(
             sensor_name=sensor_name,
-            network_name=network.name,
+            network_name=net_name,
             active_flags=incident_flags,
             state=incident_state,
         )
+        # One inc(n) per incident type instead of one per resolved event.
+        resolved_counts: Dict[str, int] = {}
         for inc_type, _event in newly_resolved:
-            UXI_INCIDENTS_RESOLVED_TOTAL.labels(
-                sensor=sensor_name, network=network.name, type=inc_type
-            ).inc()
-        update_incident_metrics(
+            resolved_counts[inc_type] = resolved_counts.get(inc_type, 0) + 1
+        for inc_type, count in resolved_counts.items():
+            counter = resolved_counters.get((net_name, inc_type))
+            if counter is None:
+                counter = UXI_INCIDENTS_RESOLVED_TOTAL.labels(
+                    sensor=sensor_name, network=net_name, type=inc_type
+                )
+                resolved_counters[(net_name, inc_type)] = counter
+            counter.inc(count)
+
+        update_all_metrics(
             sensor_name=sensor_name,
-            network_name=network.name,
-            active_flags=incident_flags,
-            state=incident_state,
-            metrics_state=incident_metrics_state,
+            network=network,
+            network_info=network_info,
+            sensor_model=sensor_model,
+            sensor_serial=sensor_serial,
+            location_cfg=location_cfg,
+            info_state=info_state,
+            steps=steps,
+            ip_present=bool(ip_address),
+            wifi_info=wifi_info,
+            service_results=service_results,
+            internal_targets=internal_target_set,
+            external_targets=external_target_set,
+            wifi_bssid_state=wifi_bssid_state,
+            internal_result=service_by_target.get("gateway"),
+            external_result=external_result,
+            incident_flags=incident_flags,
+            incident_state=incident_state,
+            incident_metrics_state=incident_metrics_state,
         )
-        save_incident_state(incident_state_path, incident_state)
+        _enqueue_write("state", copy.deepcopy(incident_state))
 
-        if network.kind == "wifi":
-            update_wifi_environment_metrics(
-                sensor_name=sensor_name,
-                network_name=network.name,
-                iface=network.iface,
-                wifi_env=wifi_env,
-                config=wifi_env_cfg,
-                env_state=wifi_env_state,
-            )
+        post_probe_hooks[net_name](wifi_env)
 
         record = build_record(
             sensor_name=sensor_name,
@@ -4583,9 +5271,16 @@ def main() -> None:
             wifi_env=wifi_env,
             triage_data=triage_data,
         )
-        write_jsonl(log_path, record)
+        _enqueue_write("jsonl", record)
 
-        time.sleep(interval_seconds)
+        next_tick += interval_seconds
+        sleep_for = next_tick - time.monotonic()
+        if sleep_for > 0:
+            time.sleep(sleep_for)
+        else:
+            # Work phase overran the interval; re-anchor instead of
+            # bursting to catch up.
+            next_tick = time.monotonic()
 
 
 if __name__ == "__main__":